@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+""" End-to-end benchmark of coffeeconnection against a local Slack stand-in
+
+Every roster size runs the real main() in its own process, the stand-in is
+served by this process so that the wall time and the peak RSS only measure the
+client. It prints one JSON record per size: wall time, number of requests, peak
+RSS and time per phase.
+
+    $ python benchmarks/bench.py --sizes 10 1000 100000 --latency 0.01 > bench.json
+"""
+
+import argparse
+import configparser
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from coffeeconnection import coffeeconnection  # noqa: E402
+from coffeeconnection.config import Configuration  # noqa: E402
+from coffeeconnection.tests.slackserver import SlackServer  # noqa: E402
+
+SIZES = [10, 100, 1000, 10000, 100000]
+
+# a Monday, first day of the period
+TODAY = datetime.date(2018, 6, 11)
+
+
+def write_config(directory, server):
+    config = configparser.ConfigParser()
+    config["DEFAULT"] = {
+        "epoch": TODAY.isoformat(),
+        "week_period": 1,
+        "hadcoffee": os.path.join(directory, "hadcoffee.txt"),
+        "channel": "C000000",
+        "token": "xoxp-bench",
+        "hook": "{}/hook".format(server.url),
+        "api_url": "{}/api".format(server.url),
+        "rate_limits": "no",
+        "metrics_json": os.path.join(directory, "metrics.json"),
+    }
+    path = os.path.join(directory, "coffeeconnection.ini")
+    with open(path, "w") as fp:
+        config.write(fp)
+    return path
+
+
+def run_one(config_path, directory):
+    """ Run main() with the configuration of write_config, in this process
+    """
+    load = Configuration.load
+
+    def load_today(config):
+        load(config)
+        config.today = TODAY
+
+    patches = [
+        patch("coffeeconnection.config._get_config_path", return_value=config_path),
+        patch.object(Configuration, "load", load_today),
+    ]
+    for patcher in patches:
+        patcher.start()
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        start = time.perf_counter()
+        status = coffeeconnection.main()
+        wall = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        for patcher in patches:
+            patcher.stop()
+    with open(os.path.join(directory, "metrics.json")) as fp:
+        metrics = json.load(fp)
+
+    return {
+        "status": status,
+        "wall_seconds": wall,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "phases": metrics["phases"],
+        "counters": metrics["counters"],
+    }
+
+
+def bench(size, latency):
+    """ Serve the stand-in and run the client in its own process
+    """
+    with tempfile.TemporaryDirectory() as directory, SlackServer(
+        size, latency
+    ) as server:
+        output = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--one",
+                write_config(directory, server),
+                directory,
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+        requests = server.requests
+
+    record = {"size": size, "latency": latency, "requests": requests}
+    record.update(json.loads(output))
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds added to every request"
+    )
+    parser.add_argument(
+        "--one", nargs=2, metavar=("CONFIG", "DIRECTORY"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.one:
+        # the logger is very verbose, keep stdout for the JSON record
+        sys.stdout, stdout = open(os.devnull, "w"), sys.stdout
+        record = run_one(*args.one)
+        stdout.write(json.dumps(record) + "\n")
+        return 0
+
+    for size in args.sizes:
+        sys.stdout.write(json.dumps(bench(size, args.latency)) + "\n")
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
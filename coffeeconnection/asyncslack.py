@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import queue
+
+from coffeeconnection.coffeeconnection import (
+    PAGE_LIMIT,
+    ROSTER_ENDPOINTS,
+    Slack,
+    check_response,
+    coffeeconnection,
+    get_niceties,
+    project_roster,
+)
+from coffeeconnection.config import Configuration
+from coffeeconnection.logger import LOGGER, setup_logger
+
+
+class FetchedResponse:
+    """ What check_response needs from an aiohttp response, read at once
+    """
+
+    def __init__(self, status, headers, content):
+        self.status_code = status
+        self.headers = headers
+        self.content = content
+        self.text = content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncSlack(Slack):
+    """ Slack client on top of aiohttp, the independent calls run
+    concurrently
+    It has the same methods as Slack, as coroutines. Use it as an async context
+    manager to open and close its HTTP connections.
+    """
+
+    def __init__(self, config, workspace=None):
+        super().__init__(config, workspace)
+        self.http = None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        limit = max(self.config.post_workers, self.config.fetch_workers)
+        self.http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit))
+        return self
+
+    async def __aexit__(self, *args):
+        await self.http.close()
+
+    def _request(self, method, url, **kwargs):
+        async def request():
+            async with self.http.request(
+                method, url, headers=self._get_headers(), **kwargs
+            ) as resp:
+                return FetchedResponse(resp.status, resp.headers, await resp.read())
+
+        return request
+
+    async def say(self, msg, blocks=None):
+        payload = {
+            "username": "coffeeconnection",
+            "icon_emoji": ":coffee:",
+            "channel": self.config.channel,
+            "text": msg,
+        }
+        if blocks:
+            payload["blocks"] = blocks
+        with self.metrics.span("say"):
+            resp = await self.scheduler.await_call(
+                "webhook", self._request("POST", self.config.hook, json=payload)
+            )
+            self.metrics.inc("webhook_calls")
+            check_response(resp)
+
+    async def match(self, couple, niceties):
+        await self.say(self.render(couple, niceties))
+
+    async def announce(self, couples, niceties, callback=None):
+        if self.config.announce == "batch":
+            return await self.announce_batches(couples, niceties, callback)
+        return await self.announce_pairs(couples, niceties, callback)
+
+    async def announce_batches(self, couples, niceties, callback=None):
+        announced = []
+        failures = []
+        for batch, text, blocks in self.batches(couples, niceties):
+            try:
+                await self.say(text, blocks)
+            except Exception as error:
+                LOGGER.error("cannot announce %s: %s", batch, error)
+                failures.extend((couple, error) for couple in batch)
+                continue
+            announced.extend(batch)
+            if callback is not None:
+                for couple in batch:
+                    callback(couple)
+        return announced, failures
+
+    async def announce_pairs(self, couples, niceties, callback=None):
+        semaphore = asyncio.Semaphore(self.config.post_workers)
+        announced = []
+        failures = []
+
+        async def announce_one(couple):
+            async with semaphore:
+                try:
+                    await self.match(couple, niceties)
+                except Exception as error:
+                    LOGGER.error("cannot announce %s: %s", couple, error)
+                    failures.append((couple, error))
+                    return
+            announced.append(couple)
+            if callback is not None:
+                callback(couple)
+
+        await asyncio.gather(*[announce_one(couple) for couple in couples])
+        return announced, failures
+
+    async def slack_request(self, endpoint, params=None):
+        # the cache key is built from the params of the sync client, aiohttp
+        # only takes strings in the query
+        query = {key: str(value) for key, value in (params or {}).items()}
+        if self.cache is not None:
+            data = self.cache.get(endpoint, params)
+            if data is not None:
+                self.metrics.inc("cache_hits")
+                return data
+
+        resp = await self.scheduler.await_call(
+            endpoint,
+            self._request(
+                "GET", "{}/{}".format(self.config.api_url, endpoint), params=query
+            ),
+        )
+        self.metrics.inc("api_calls")
+        self.metrics.inc("bytes_received", len(resp.content))
+        data = check_response(
+            resp, project_roster if endpoint in ROSTER_ENDPOINTS else None
+        )
+        if self.cache is not None:
+            self.cache.set(endpoint, params, data)
+        return data
+
+    async def slack_pages(self, endpoint, params=None):
+        params = dict(params or {})
+        params.setdefault("limit", PAGE_LIMIT)
+        while True:
+            data = await self.slack_request(endpoint, params)
+            yield data
+            cursor = data.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                return
+            params["cursor"] = cursor
+
+    async def unavailable_users(self):
+        """ The unavailable users of the workspace
+        """
+        size = 0
+        unavailable = []
+        async for page in self.slack_pages("users.list"):
+            for member in page["members"]:
+                size += 1
+                user = self._slim_user(member)
+                if not self.is_available(user):
+                    unavailable.append(user)
+        self.workspace.size = size
+        return unavailable
+
+    async def channel_members(self):
+        members = []
+        async for page in self.slack_pages(
+            "conversations.members", {"channel": self.config.channel}
+        ):
+            members.extend(page["members"])
+        return members
+
+    async def get_slack_user(self, user_id, semaphore):
+        async with semaphore:
+            try:
+                data = await self.slack_request("users.info", {"user": user_id})
+            except Exception as error:
+                return self._deleted_user(user_id, error)
+        return self._slim_user(data["user"])
+
+    async def get_slack_members(self):
+        with self.metrics.span("get_slack_members"):
+            members = await self._get_slack_members()
+        if self.config.skip_away or self.config.skip_dnd:
+            # the statuses are fetched by threads, with the requests session
+            loop = asyncio.get_running_loop()
+            with self.metrics.span("presence"):
+                members = await loop.run_in_executor(
+                    None, self.filter_presence, members
+                )
+        return members
+
+    async def _get_slack_members(self):
+        strategy = self.config.roster_strategy
+        if strategy == "events":
+            # the store is local, only its reconciliation uses the API
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, super()._get_slack_members)
+
+        known_size = self.config.workspace_size or self.workspace.size
+        if strategy == "workspace" or (strategy == "auto" and not known_size):
+            # both lists are independent, fetch them at the same time
+            LOGGER.info("fetch all the users of the workspace")
+            members, unavailable = await asyncio.gather(
+                self.channel_members(), self.unavailable_users()
+            )
+            return self.filter_members(members, unavailable)
+
+        members = await self.channel_members()
+        if self.channel_first(len(members)):
+            LOGGER.info("fetch the %s users of the channel", len(members))
+            semaphore = asyncio.Semaphore(self.config.fetch_workers)
+            users = await asyncio.gather(
+                *[self.get_slack_user(member, semaphore) for member in members]
+            )
+        else:
+            LOGGER.info("fetch all the users of the workspace")
+            users = await self.unavailable_users()
+        return self.filter_members(members, users)
+
+
+class SyncBridge:
+    """ Let the synchronous coffeeconnection() drive an AsyncSlack from a
+    worker thread, the coroutines run in the event loop
+    """
+
+    def __init__(self, slack, loop):
+        self.slack = slack
+        self.loop = loop
+
+    def __getattr__(self, name):
+        return getattr(self.slack, name)
+
+    def get_slack_members(self):
+        return asyncio.run_coroutine_threadsafe(
+            self.slack.get_slack_members(), self.loop
+        ).result()
+
+    def announce(self, couples, niceties, callback=None):
+        # the callback writes the state, it has to run in this thread, None
+        # tells the announce is over
+        announced = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self.slack.announce(couples, niceties, announced.put), self.loop
+        )
+        future.add_done_callback(lambda _: announced.put(None))
+        for couple in iter(announced.get, None):
+            if callback is not None:
+                callback(couple)
+        return future.result()
+
+
+async def async_coffeeconnection(slack, config, niceties):
+    """ coffeeconnection() with an AsyncSlack
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        None, coffeeconnection, SyncBridge(slack, loop), config, niceties
+    )
+
+
+async def async_main(config, niceties):
+    async with AsyncSlack(config) as slack:
+        await async_coffeeconnection(slack, config, niceties)
+
+
+def main():
+    setup_logger()
+
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        LOGGER.error(
+            "coffeeconnection-async needs aiohttp: "
+            "pip install coffeeconnection[async]"
+        )
+        return 1
+
+    try:
+        config = Configuration()
+        config.load()
+        niceties = get_niceties()
+        asyncio.run(async_main(config, niceties))
+        return 0
+    except Exception as error:
+        LOGGER.exception("Error: %s", str(error))
+        return 1
+
+
+if __name__ == "__main__":
+    main()
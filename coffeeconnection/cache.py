@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from coffeeconnection.config import get_cache_path
+from coffeeconnection.logger import LOGGER
+
+
+class ResponseCache:
+    """ Store Slack API responses on disk, keyed by workspace, endpoint and
+    parameters
+
+    Entries older than `ttl` seconds are ignored, and the oldest entries are
+    evicted once the cache directory grows beyond `max_size` bytes. The size
+    of the directory is counted by the writes, it is only listed by the first
+    write and when the count goes beyond `max_size`.
+    """
+
+    def __init__(self, directory, ttl, max_size, refresh=False, workspace=""):
+        self.directory = directory
+        # the workspaces sharing the directory never read each other responses
+        self.workspace = workspace
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh = refresh
+        # bytes in the directory, None until it is listed
+        self.size = None
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        if config.cache_ttl <= 0:
+            return None
+        return cls(
+            config.cache_dir or get_cache_path(),
+            config.cache_ttl,
+            config.cache_max_size,
+            refresh=config.cache_refresh,
+            workspace=workspace_key(config.token, config.api_url),
+        )
+
+    def _path(self, endpoint, params):
+        key = json.dumps([self.workspace, endpoint, sorted((params or {}).items())])
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "{}.json".format(digest))
+
+    def get(self, endpoint, params=None):
+        if self.refresh:
+            return None
+        path = self._path(endpoint, params)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        LOGGER.debug("cache hit for %s", endpoint)
+        return data
+
+    def set(self, endpoint, params, data):
+        path = self._path(endpoint, params)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fp:
+            json.dump(data, fp)
+            written = fp.tell()
+        os.replace(tmp, path)
+        with self.lock:
+            if self.size is not None:
+                # an entry replaced is counted twice until the next listing
+                self.size += written
+                if self.size <= self.max_size:
+                    return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # evicted by another thread
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+        while total > self.max_size and entries:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # evicted by another thread
+                pass
+            total -= size
+            LOGGER.debug("evicted %s from cache", path)
+        with self.lock:
+            self.size = total
+
+
+def workspace_key(token, api_url):
+    """ Identify a workspace without writing its token in the cache
+    """
+    return hashlib.sha256("{} {}".format(token, api_url).encode("utf-8")).hexdigest()
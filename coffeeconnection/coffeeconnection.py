@@ -1,26 +1,88 @@
 #!/usr/bin/env python3
 
-import requests
+import json
 import os
 import random
+import threading
+import time
 import math
-import pkg_resources
 
-from coffeeconnection.logger import LOGGER, setup_logger
+from coffeeconnection.logger import LOGGER, log_members, setup_logger
 from coffeeconnection.config import Configuration
+from coffeeconnection.cache import ResponseCache
+from coffeeconnection.state import open_state
+from coffeeconnection.ratelimit import RequestScheduler, request_cost
+from coffeeconnection.matching import PairHistory, group_players, pair_players
+from coffeeconnection.members import Members, as_members
+from coffeeconnection.metrics import Metrics
+from coffeeconnection.workdays import WorkCalendar, parse_day
+
+# Slack recommends no more than 200 results per page
+PAGE_LIMIT = 200
+# a message has at most 50 blocks, a section at most 3000 characters, and the
+# text of a message should stay under 4000 characters
+MAX_BLOCKS = 50
+MAX_SECTION_LENGTH = 3000
+MAX_TEXT_LENGTH = 4000
+# users per dnd.teamInfo call
+DND_BATCH = 50
+# their responses change too often for the response cache
+STATUS_ENDPOINTS = ("users.getPresence", "dnd.teamInfo")
+# the only fields read from the users.list and users.info responses
+ROSTER_ENDPOINTS = ("users.list", "users.info")
+ROSTER_FIELDS = frozenset(
+    (
+        "ok",
+        "error",
+        "needed",
+        "warning",
+        "members",
+        "user",
+        "response_metadata",
+        "next_cursor",
+        "id",
+        "deleted",
+        "is_bot",
+        "profile",
+        "status_emoji",
+    )
+)
 
 
 def get_niceties():
-    niceties_file = pkg_resources.resource_filename(__name__, "niceties.txt")
-    with open(niceties_file) as niceties:
-        return [line.strip() for line in niceties.readlines() if len(line) > 1]
+    from importlib import resources
+
+    try:
+        niceties = resources.files("coffeeconnection").joinpath("niceties.txt")
+        text = niceties.read_text()
+    except AttributeError:  # Python < 3.9
+        text = resources.read_text("coffeeconnection", "niceties.txt")
+    return [line.strip() for line in text.splitlines(True) if len(line) > 1]
+
 
+def project_roster(pairs):
+    """ json object_pairs_hook keeping only the ROSTER_FIELDS, the rest of an
+    object (profile fields, images...) is dropped as soon as it is parsed
+    """
+    return {key: value for key, value in pairs if key in ROSTER_FIELDS}
+
+
+class ApiError(Exception):
+    """ Slack answered ok: false, error is its error code (user_not_found...)
+    """
 
-def check_response(response):
+    def __init__(self, data):
+        super().__init__("API response: {}".format(data))
+        self.error = data.get("error")
+
+
+def check_response(response, object_pairs_hook=None):
     if response.status_code == 400:
         raise Exception("Bad request: {}".format(response.text))
     elif response.status_code == 401:
         raise Exception("Unauthorized: {}".format(response.text))
+    elif response.status_code == 429:
+        raise Exception("Rate limited: {}".format(response.text))
 
     if "application/json" not in response.headers["content-type"]:
         if response.text.lower() != "ok":
@@ -29,20 +91,124 @@ def check_response(response):
             return {}
 
     try:
-        data = response.json()
+        if object_pairs_hook is None:
+            data = response.json()
+        else:
+            data = json.loads(response.content, object_pairs_hook=object_pairs_hook)
     except Exception as error:
         raise Exception("API response: {} {}".format(str(error), response.text[200]))
 
     if not data.get("ok", False):
-        raise Exception("API response: {}".format(data))
+        raise ApiError(data)
     if data.get("warning", None) is not None:
         LOGGER.warning(data["warning"])
     return data
 
 
+class Workspace:
+    """ HTTP session, rate limits and users shared by the channels of a slack
+    workspace
+    roster_ttl is how long (in seconds) the users fetched for one channel are
+    reused for the others, 0 means they are not kept
+    The HTTP stack is only loaded by the first request, days without coffee
+    don't pay for it.
+    """
+
+    def __init__(self, config, roster_ttl=0):
+        self.scheduler = RequestScheduler(enabled=config.rate_limits)
+        self.pool_size = config.post_workers
+        self._session = None
+        self.session_lock = threading.Lock()
+        self.roster_ttl = roster_ttl
+        # number of users seen by the last users.list, None until then
+        self.size = None
+        self.roster = None
+        self.roster_time = None
+        self.lock = threading.Lock()
+        # kind -> {user id: (time, value)}
+        self.statuses = {}
+
+    @property
+    def session(self):
+        with self.session_lock:
+            if self._session is None:
+                import requests
+
+                self._session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.pool_size)
+                self._session.mount("https://", adapter)
+                self._session.mount("http://", adapter)
+            return self._session
+
+    def users(self, fetch):
+        """ Return the users fetched by `fetch`, reused while they are fresh
+        """
+        if self.roster_ttl <= 0:
+            return fetch()
+        with self.lock:
+            now = time.monotonic()
+            if self.roster is None or now - self.roster_time > self.roster_ttl:
+                self.roster = list(fetch())
+                self.roster_time = now
+            return self.roster
+
+    def statuses_of(self, kind, ids, fetch, ttl):
+        """ Return {id: value} for the ids, values of this kind younger than
+        ttl seconds are reused, the others are fetched with fetch(missing ids)
+        which returns {id: value}
+        """
+        now = time.monotonic()
+        values = {}
+        missing = []
+        with self.lock:
+            cache = self.statuses.setdefault(kind, {})
+            for user_id in ids:
+                entry = cache.get(user_id)
+                if entry is not None and now - entry[0] <= ttl:
+                    values[user_id] = entry[1]
+                else:
+                    missing.append(user_id)
+        if missing:
+            fetched = fetch(missing)
+            with self.lock:
+                for user_id, value in fetched.items():
+                    cache[user_id] = (now, value)
+            values.update(fetched)
+        return values
+
+
 class Slack:
-    def __init__(self, config):
+    def __init__(self, config, workspace=None):
         self.config = config
+        self.cache = ResponseCache.from_config(config)
+        self.workspace = workspace if workspace is not None else Workspace(config)
+        self.scheduler = RequestScheduler(
+            enabled=config.rate_limits, workspace=self.workspace.scheduler
+        )
+        self.metrics = Metrics()
+        # records the latency of every HTTP call when it is set
+        self.profiler = None
+
+    @property
+    def session(self):
+        return self.workspace.session
+
+    def _timed(self, method, request):
+        if self.profiler is None:
+            return request
+
+        def timed():
+            start = time.perf_counter()
+            response = request()
+            self.profiler.record(
+                method,
+                time.perf_counter() - start,
+                response.status_code,
+                len(response.content),
+            )
+            return response
+
+        return timed
 
     def _get_headers(self):
         return {
@@ -50,89 +216,419 @@ class Slack:
             "Authorization": "Bearer {}".format(self.config.token),
         }
 
-    def say(self, msg):
+    def say(self, msg, blocks=None):
         payload = {
             "username": "coffeeconnection",
             "icon_emoji": ":coffee:",
             "channel": self.config.channel,
             "text": msg,
         }
-        resp = requests.post(
-            self.config.hook, json=payload, headers=self._get_headers()
-        )
-        check_response(resp)
+        if blocks:
+            payload["blocks"] = blocks
+        with self.metrics.span("say"):
+            resp = self.scheduler.call(
+                "webhook",
+                self._timed(
+                    "webhook",
+                    lambda: self.session.post(
+                        self.config.hook, json=payload, headers=self._get_headers()
+                    ),
+                ),
+            )
+            self.metrics.inc("webhook_calls")
+            check_response(resp)
+
+    @staticmethod
+    def render(couple, niceties):
+        """ Fill a nicety with the members of a couple or of a bigger group,
+        the first placeholder then gets all the members but the last one
+        """
+        sentence = random.choice(niceties)
+        mentions = ["<@%s>" % member for member in couple]
+        if len(mentions) > 2:
+            mentions = [", ".join(mentions[:-1]), mentions[-1]]
+        return sentence.format(*mentions)
 
     def match(self, couple, niceties):
-        sentence = random.choice(niceties)
-        self.say(sentence.format("<@%s>" % couple[0], "<@%s>" % couple[1]))
+        self.say(self.render(couple, niceties))
+
+    def batches(self, couples, niceties):
+        """ Split the announce of the couples in messages within slack limits
+        yield the couples of each message, its text and its blocks
+        """
+        batch = []
+        lines = []
+        length = 0
+        for couple in couples:
+            # a single line longer than a message is cut
+            line = self.render(couple, niceties)[:MAX_TEXT_LENGTH]
+            if batch and (
+                len(batch) == MAX_BLOCKS or length + len(line) > MAX_TEXT_LENGTH
+            ):
+                yield batch, "\n".join(lines), sections(lines)
+                batch = []
+                lines = []
+                length = 0
+            batch.append(couple)
+            lines.append(line)
+            length += len(line) + 1
+        if batch:
+            yield batch, "\n".join(lines), sections(lines)
+
+    def announce(self, couples, niceties, callback=None):
+        """ Announce the couples, callback is called with each couple as soon
+        as it is announced
+        return the announced couples and a list of (couple, error) failures
+        """
+        if self.config.announce == "batch":
+            return self.announce_batches(couples, niceties, callback)
+        return self.announce_pairs(couples, niceties, callback)
+
+    def announce_batches(self, couples, niceties, callback=None):
+        """ Announce the couples in as few messages as possible
+        """
+        announced = []
+        failures = []
+        for batch, text, blocks in self.batches(couples, niceties):
+            try:
+                self.say(text, blocks)
+            except Exception as error:
+                LOGGER.error("cannot announce %s: %s", batch, error)
+                failures.extend((couple, error) for couple in batch)
+                continue
+            announced.extend(batch)
+            if callback is not None:
+                for couple in batch:
+                    callback(couple)
+        return announced, failures
+
+    def announce_pairs(self, couples, niceties, callback=None):
+        """ Announce each couple in its own message, concurrently
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        announced = []
+        failures = []
+        with ThreadPoolExecutor(max_workers=self.config.post_workers) as executor:
+            futures = {
+                executor.submit(self.match, couple, niceties): couple
+                for couple in couples
+            }
+            for future in as_completed(futures):
+                couple = futures[future]
+                try:
+                    future.result()
+                except Exception as error:
+                    LOGGER.error("cannot announce %s: %s", couple, error)
+                    failures.append((couple, error))
+                    continue
+                announced.append(couple)
+                if callback is not None:
+                    callback(couple)
+        return announced, failures
+
+    def __slack_request(self, endpoint, params=None):
+        cache = self.cache if endpoint not in STATUS_ENDPOINTS else None
+        if cache is not None:
+            data = cache.get(endpoint, params)
+            if data is not None:
+                self.metrics.inc("cache_hits")
+                return data
+
+        resp = self.scheduler.call(
+            endpoint,
+            self._timed(
+                endpoint,
+                lambda: self.session.get(
+                    "{}/{}".format(self.config.api_url, endpoint),
+                    params=params,
+                    headers=self._get_headers(),
+                ),
+            ),
+        )
+        self.metrics.inc("api_calls")
+        self.metrics.inc("bytes_received", len(resp.content))
+        data = check_response(
+            resp, project_roster if endpoint in ROSTER_ENDPOINTS else None
+        )
+        if cache is not None:
+            cache.set(endpoint, params, data)
+        return data
+
+    def __slack_pages(self, endpoint, params=None):
+        """ Yield every page of a cursor-paginated endpoint
+        """
+        params = dict(params or {})
+        params.setdefault("limit", PAGE_LIMIT)
+        while True:
+            data = self.__slack_request(endpoint, params)
+            yield data
+            cursor = data.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                return
+            params["cursor"] = cursor
+
+    @staticmethod
+    def _slim_user(member):
+        """ Keep only the fields needed to know if a user is available
+        """
+        return {
+            "id": member["id"],
+            "deleted": member.get("deleted", False),
+            "is_bot": member.get("is_bot", False),
+            "status_emoji": member.get("profile", {}).get("status_emoji", ""),
+        }
 
-    def __slack_request(self, endpoint):
-        resp = requests.get(
-            "https://slack.com/api/{}".format(endpoint), headers=self._get_headers()
+    def iter_slack_users(self):
+        """ Yield the workspace users, page by page
+        """
+        size = 0
+        for page in self.__slack_pages("users.list"):
+            for member in page["members"]:
+                size += 1
+                yield self._slim_user(member)
+        self.workspace.size = size
+
+    def iter_channel_members(self):
+        for page in self.__slack_pages(
+            "conversations.members", {"channel": self.config.channel}
+        ):
+            yield from page["members"]
+
+    @staticmethod
+    def _deleted_user(user_id, error):
+        """ The user of a users.info call which failed with error, only a user
+        unknown to slack is taken as deleted, the other errors are raised
+        """
+        if not (isinstance(error, ApiError) and error.error == "user_not_found"):
+            raise error
+        LOGGER.warning("cannot get user %s: %s", user_id, error)
+        return {"id": user_id, "deleted": True, "is_bot": False, "status_emoji": ""}
+
+    def get_slack_user(self, user_id):
+        try:
+            data = self.__slack_request("users.info", {"user": user_id})
+        except Exception as error:
+            return self._deleted_user(user_id, error)
+        return self._slim_user(data["user"])
+
+    def iter_channel_users(self, members):
+        """ Yield the users of the channel, fetched concurrently
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.config.fetch_workers) as executor:
+            yield from executor.map(self.get_slack_user, members)
+
+    def channel_first(self, nbmembers):
+        """ Should the users be fetched one by one from the channel members
+        rather than with users.list?
+        """
+        if self.config.roster_strategy in ("channel", "workspace"):
+            return self.config.roster_strategy == "channel"
+        size = self.config.workspace_size or self.workspace.size
+        if not size:
+            return False
+        pages = math.ceil(size / PAGE_LIMIT)
+        return request_cost("users.info", nbmembers) < request_cost("users.list", pages)
+
+    def is_available(self, user):
+        return not (
+            user["deleted"]
+            or user["is_bot"]
+            or user["status_emoji"] in self.config.skip_emoji_list
         )
-        return check_response(resp)
 
     def get_slack_members(self):
-        data_users = self.__slack_request("users.list")
-        deads = []
-        for member in data_users["members"]:
-            if (
-                member["deleted"]
-                or member["is_bot"]
-                or member["profile"]["status_emoji"] in self.config.skip_emoji_list
-            ):
-                deads.append(member["id"])
+        with self.metrics.span("get_slack_members"):
+            members = self._get_slack_members()
+        if self.config.skip_away or self.config.skip_dnd:
+            with self.metrics.span("presence"):
+                members = self.filter_presence(members)
+        return members
 
-        channel_info = self.__slack_request(
-            "channels.info?channel={}".format(self.config.channel)
+    def is_away(self, user_id):
+        try:
+            data = self.__slack_request("users.getPresence", {"user": user_id})
+        except Exception as error:
+            LOGGER.warning("cannot get the presence of %s: %s", user_id, error)
+            return False
+        return data.get("presence") == "away"
+
+    def away_users(self, user_ids):
+        """ return {user id: is away}, fetched concurrently
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.config.fetch_workers) as executor:
+            return dict(zip(user_ids, executor.map(self.is_away, user_ids)))
+
+    def dnd_batch(self, user_ids):
+        try:
+            data = self.__slack_request("dnd.teamInfo", {"users": ",".join(user_ids)})
+        except Exception as error:
+            LOGGER.warning("cannot get the do not disturb status: %s", error)
+            return {user_id: False for user_id in user_ids}
+        now = time.time()
+        dnd = {}
+        for user_id in user_ids:
+            status = data.get("users", {}).get(user_id, {})
+            dnd[user_id] = bool(
+                status.get("dnd_enabled")
+                and status.get("next_dnd_start_ts", now) <= now
+                and now < status.get("next_dnd_end_ts", now)
+            )
+        return dnd
+
+    def dnd_users(self, user_ids):
+        """ return {user id: is in do not disturb}, dnd.teamInfo takes
+        DND_BATCH users per call, the calls run concurrently
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        batches = [
+            user_ids[start : start + DND_BATCH]
+            for start in range(0, len(user_ids), DND_BATCH)
+        ]
+        dnd = {}
+        with ThreadPoolExecutor(max_workers=self.config.fetch_workers) as executor:
+            for statuses in executor.map(self.dnd_batch, batches):
+                dnd.update(statuses)
+        return dnd
+
+    def filter_presence(self, members):
+        """ Remove the members who are away or in do not disturb, the statuses
+        are kept presence_ttl seconds by the workspace
+        """
+        ttl = self.config.presence_ttl
+        candidates = list(members)
+        unavailable = set()
+        if self.config.skip_dnd:
+            dnd = self.workspace.statuses_of("dnd", candidates, self.dnd_users, ttl)
+            unavailable.update(user_id for user_id, value in dnd.items() if value)
+            candidates = [member for member in candidates if member not in unavailable]
+        if self.config.skip_away:
+            away = self.workspace.statuses_of("away", candidates, self.away_users, ttl)
+            unavailable.update(user_id for user_id, value in away.items() if value)
+
+        kept = Members()
+        filtered = []
+        for member in members:
+            if member in unavailable:
+                filtered.append(member)
+            else:
+                kept.add(member)
+        self.metrics.inc("members_away", len(filtered))
+        log_members(
+            "away or in do not disturb",
+            filtered,
+            self.config.log_members,
+            self.config.log_sample,
         )
-        members = []
-        for member in channel_info["channel"]["members"]:
+        return kept
+
+    def _get_slack_members(self):
+        if self.config.roster_strategy == "events":
+            return self._get_slack_members_from_store()
+        channel_members, users = self.fetch_roster()
+        return self.filter_members(channel_members, users)
+
+    def _get_slack_members_from_store(self):
+        """ Read the roster kept up to date by the events listener, it is
+        reconciled with the API every reconcile_days days
+        """
+        from coffeeconnection.events import RosterStore
+
+        channel = self.config.channel
+        store = RosterStore(self.config.roster_db)
+        try:
+            if store.is_fresh(channel, self.config.reconcile_days * 24 * 3600):
+                LOGGER.info("read the users of the channel from the roster store")
+                return self.filter_members(
+                    store.channel_members(channel), store.channel_users(channel)
+                )
+            LOGGER.info("reconcile the roster store")
+            channel_members, users = self.fetch_roster()
+            in_channel = set(channel_members)
+            users = [user for user in users if user["id"] in in_channel]
+            store.reconcile(channel, channel_members, users)
+            return self.filter_members(channel_members, users)
+        finally:
+            store.close()
+
+    def fetch_roster(self):
+        """ return the channel members and an iterable of the users needed to
+        know if they are available
+        """
+        channel_members = list(self.iter_channel_members())
+        if self.channel_first(len(channel_members)):
+            LOGGER.info("fetch the %s users of the channel", len(channel_members))
+            users = self.iter_channel_users(channel_members)
+        else:
+            LOGGER.info("fetch all the users of the workspace")
+            users = self.workspace.users(self.iter_slack_users)
+        return channel_members, users
+
+    def filter_members(self, channel_members, users):
+        deads = set()
+        for user in users:
+            if not self.is_available(user):
+                deads.add(user["id"])
+
+        members = Members()
+        filtered = []
+        for member in channel_members:
             if member not in deads:
-                members.append(member)
+                members.add(member)
             else:
-                LOGGER.info("%s is not available", member)
+                filtered.append(member)
+        self.metrics.inc("members_filtered", len(filtered))
+        log_members(
+            "not available", filtered, self.config.log_members, self.config.log_sample
+        )
         return members
 
 
+def sections(lines):
+    """ One block per line of an announce
+    """
+    return [
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": line[:MAX_SECTION_LENGTH]},
+        }
+        for line in lines
+    ]
+
+
 def is_off(today, days_off):
-    return (
-        today.strftime("%w") == "6"  # Saturday
-        or today.strftime("%w") == "0"  # Sunday
-        or today.strftime("%Y-%m-%d") in days_off
-    )
+    return today.weekday() >= 5 or today.strftime("%Y-%m-%d") in days_off
 
 
 def need_reset(today, epoch, week_period):
-    return (today - epoch).days % (week_period * 7) == 0
+    return WorkCalendar(epoch, week_period).is_period_start(today)
 
 
-def dayleft(today, epoch, week_period):
+def dayleft(today, epoch, week_period, days_off=()):
     """ Number of days left in this week_period (eg 1w or 2w)
-    This assume epoch start on a Monday (modulo week_period) and Saturday and
-    Sunday doesn't count
+    This assume epoch start on a Monday (modulo week_period) and Saturday,
+    Sunday and days_off doesn't count
     """
-    nbweekend = int((today - epoch).days / 7)
-    return week_period * 5 - (
-        ((today - epoch).days - nbweekend * 2) % (week_period * 5)
-    )
-
-
-def get_already_had_coffee_members(filepath):
-    hadcoffee = []
-    with open(filepath) as fp:
-        hadcoffee = [line.strip() for line in fp.readlines()]
-    return hadcoffee
+    days_off = [parse_day(day) for day in days_off]
+    return WorkCalendar(epoch, week_period, days_off).dayleft(today)
 
 
-def create_matches(queue, nbdayleft):
+def create_matches(queue, nbdayleft, history=None, group_size=2):
     """ return a list of tuple and the modified queue
+    the pairs already in history are avoided when possible
     """
+    queue = as_members(queue)
     nbplayer = math.ceil(len(queue) / nbdayleft)
+    if group_size > 2:
+        return create_groups(queue, nbplayer, history, group_size)
 
     if nbplayer == 1:
-        players = queue[:2]
-        queue = queue[2:]
+        players = queue.take(2)
         LOGGER.info("one match today")
     else:
         if nbplayer % 2 != 0:
@@ -141,8 +637,10 @@ def create_matches(queue, nbdayleft):
             else:
                 nbplayer += 1
         LOGGER.info("%s matched today", nbplayer)
-        players = queue[:nbplayer]
-        queue = queue[nbplayer:]
+        players = queue.take(nbplayer)
+
+    if history is not None:
+        return pair_players(players, history), queue
 
     matches = []
     while len(players) >= 2:
@@ -151,72 +649,170 @@ def create_matches(queue, nbdayleft):
     return matches, queue
 
 
+def create_groups(queue, nbplayer, history, group_size):
+    """ Groups of at most group_size for the nbplayer first members of the
+    queue, rounded up to whole groups, nobody is left alone at the end of the
+    queue
+    """
+    nbplayer = min(math.ceil(nbplayer / group_size) * group_size, len(queue))
+    if len(queue) - nbplayer == 1:
+        nbplayer += 1
+    LOGGER.info("%s matched today", nbplayer)
+    players = queue.take(nbplayer)
+    if history is None:
+        history = PairHistory()
+    return group_players(players, history, group_size), queue
+
+
+def place_leftover(member, matches, members, group_size=2):
+    """ Add the last member without a partner to the matches, in the smallest
+    group when groups are bigger than pairs, else with someone who already had
+    a coffee. When everyone else is matched today, the pair becomes a trio.
+    """
+    if group_size == 2 or not matches:
+        others = as_members(members).copy()
+        for group in matches:
+            for matched in group:
+                others.discard(matched)
+        others.discard(member)
+        if others:
+            matches.append(alone(member, others))
+            return
+    if matches:
+        index = min(range(len(matches)), key=lambda index: len(matches[index]))
+        matches[index] += (member,)
+    else:
+        LOGGER.info("nobody to meet %s", member)
+
+
 def alone(member, memberlist):
-    others = memberlist[:]
-    others.remove(member)
-    other = random.choice(others)
+    other = as_members(memberlist).sample(exclude=member)
     return (other, member)
 
 
+def scheduled_matches(config, calendar, members, hadcoffee, state):
+    """ The matches of the day from the schedule of the period, it is planned
+    by the first run of the period
+    """
+    from coffeeconnection.schedule import Schedule
+
+    period = calendar.period(config.today)
+    history = state.pair_history()
+    schedule = Schedule.load(config.schedule_file)
+    if schedule is None or schedule.period != period:
+        LOGGER.info("plan the period")
+        waiting = [member for member in members if member not in hadcoffee]
+        days = calendar.working_days(config.today)
+        schedule = Schedule.plan(period, waiting, days, history, config.group_size)
+
+    matches, waiting = schedule.today(
+        config.today, members, hadcoffee, history, config.group_size
+    )
+    if waiting:
+        LOGGER.info("%s waiting for a partner", " ".join(waiting))
+    if len(waiting) == 1 and calendar.dayleft(config.today) == 1:
+        place_leftover(waiting[0], matches, members, config.group_size)
+    schedule.save(config.schedule_file)
+    return matches
+
+
 def coffeeconnection(slack, config, niceties):
-    if not os.path.exists(config.hadcoffee_file) or need_reset(
-        config.today, config.epoch, config.week_period
-    ):
+    slack.metrics.reset()
+    throttled = slack.scheduler.throttled
+    state = open_state(config)
+    try:
+        run(slack, config, niceties, state)
+    finally:
+        state.close()
+        throttled = slack.scheduler.throttled - throttled
+        LOGGER.info("%.2fs throttled by rate limits", throttled)
+        slack.metrics.inc("throttled_seconds", throttled)
+        slack.metrics.export(config)
+
+
+def run(slack, config, niceties, state):
+    calendar = WorkCalendar.from_config(config)
+    period = calendar.period(config.today)
+    if calendar.is_period_start(config.today):
         LOGGER.info("reset queue")
-        open(config.hadcoffee_file, "w").close()
+        state.reset(period)
 
-    if is_off(config.today, config.days_off):
+    if calendar.is_off(config.today):
         LOGGER.info("no coffee today")
         return
 
-    nbdayleft = dayleft(config.today, config.epoch, config.week_period)
+    nbdayleft = calendar.dayleft(config.today)
     LOGGER.info("%s days left", nbdayleft)
 
-    members = slack.get_slack_members()
-    queue = []
-    hadcoffee = get_already_had_coffee_members(config.hadcoffee_file)
+    def record(couple):
+        with metrics.span("state_write"):
+            state.record([couple], period, config.today)
+        metrics.inc("pairs")
+
+    def announce(matches):
+        # the announced couples are recorded, fail the run for the others
+        _, failures = slack.announce(matches, niceties, record)
+        if failures:
+            raise Exception(
+                "{} matches not announced: {}".format(len(failures), failures[0][1])
+            )
+
+    metrics = slack.metrics
+    members = as_members(slack.get_slack_members())
+    queue = Members()
+    with metrics.span("state_load"):
+        hadcoffee = state.load(period)
+
+    if config.schedule_file:
+        with metrics.span("create_matches"):
+            matches = scheduled_matches(config, calendar, members, hadcoffee, state)
+        announce(matches)
+        return
 
+    had = []
     for member in members:
         if member not in hadcoffee:
-            LOGGER.info("%s may have a coffee", member)
-            queue.append(member)
+            queue.add(member)
         else:
-            LOGGER.info("%s already had a coffee", member)
+            had.append(member)
+    log_members("may have a coffee", queue, config.log_members, config.log_sample)
+    log_members("already had a coffee", had, config.log_members, config.log_sample)
 
     LOGGER.info("number in queue %s", len(queue))
     if not queue:
         return
     elif len(queue) == 1:
         couple = alone(queue[0], members)
-        hadcoffee.append(couple[0])
-        hadcoffee.append(couple[1])
-        slack.match(couple, niceties)
+        announce([couple])
         return
 
-    random.shuffle(queue)
-
-    (matches, queue) = create_matches(queue, nbdayleft)
+    queue.shuffle()
 
-    hadcoffee_today = []
-    for couple in matches:
-        slack.match(couple, niceties)
-        hadcoffee.append(couple[0])
-        hadcoffee.append(couple[1])
-        hadcoffee_today.append(couple[0])
-        hadcoffee_today.append(couple[1])
+    with metrics.span("state_load"):
+        history = state.pair_history()
+    with metrics.span("create_matches"):
+        matches, queue = create_matches(queue, nbdayleft, history, config.group_size)
 
     if len(queue) == 1 and nbdayleft == 1:
         LOGGER.info("one leftover %s", queue[0])
-        for coffied in hadcoffee_today:
-            members.remove(coffied)
-        couple = alone(queue[0], members)
-        hadcoffee.append(couple[0])
-        hadcoffee.append(couple[1])
-        slack.match(couple, niceties)
+        place_leftover(queue[0], matches, members, config.group_size)
 
-    with open(config.hadcoffee_file, "w") as fp:
-        for coffied in hadcoffee:
-            fp.write("{}\n".format(coffied))
+    announce(matches)
+
+
+def profile(slack, config, niceties):
+    """ Run coffeeconnection under the profiler, the reports are written next
+    to the log file
+    """
+    from coffeeconnection.config import get_log_path
+    from coffeeconnection.profiling import Profiler
+
+    directory = config.profile_dir or os.path.dirname(get_log_path())
+    with Profiler(directory) as profiler:
+        if config.profile_http:
+            slack.profiler = profiler
+        coffeeconnection(slack, config, niceties)
+    LOGGER.info("profile written in %s", profiler.report_path)
 
 
 def main():
@@ -227,7 +823,10 @@ def main():
         config.load()
         slack = Slack(config)
         niceties = get_niceties()
-        coffeeconnection(slack, config, niceties)
+        if config.profile:
+            profile(slack, config, niceties)
+        else:
+            coffeeconnection(slack, config, niceties)
         return 0
     except Exception as error:
         LOGGER.exception("Error: %s\n%s", str(error))
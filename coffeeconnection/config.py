@@ -1,44 +1,165 @@
 import os
 import configparser
-import appdirs
 import datetime
 
 
 def _get_config_path():
+    import appdirs
+
     return os.path.join(
         appdirs.user_config_dir("coffeeconnection"), "coffeeconnection.ini"
     )
 
 
+def get_cache_path():
+    import appdirs
+
+    return appdirs.user_cache_dir("coffeeconnection")
+
+
+def get_log_path():
+    import appdirs
+
+    directory = appdirs.user_log_dir("coffeeconnection")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, "coffeeconnection.log")
+
+
 class Configuration:
-    def __init__(self):
+    def __init__(self, section="DEFAULT"):
         self.path = _get_config_path()
+        self.section = section
         self.today = datetime.date.today()
         self.epoch = None
         self.week_period = None
         self.hadcoffee_file = None
+        self.state_backend = "journal"
+        self.state_db = "coffeeconnection.db"
         self.channel = None
         self.token = None
         self.hook = None
+        self.api_url = "https://slack.com/api"
+        self.rate_limits = True
         self.days_off = []
+        self.holidays_files = []
         self.skip_emoji_list = []
+        self.announce = "batch"
+        self.post_workers = 4
+        self.fetch_workers = 8
+        self.roster_strategy = "auto"
+        self.workspace_size = 0
+        self.roster_db = "roster.db"
+        self.reconcile_days = 7
+        self.signing_secret = None
+        self.events_port = 3000
+        self.run_at = datetime.time(16, 0)
+        self.cache_dir = None
+        self.schedule_file = None
+        self.group_size = 2
+        self.skip_away = False
+        self.skip_dnd = False
+        self.presence_ttl = 300
+        self.log_members = "summary"
+        self.log_sample = 5
+        self.profile = False
+        self.profile_http = True
+        self.profile_dir = None
+        self.metrics_json = None
+        self.metrics_prom = None
+        self.cache_ttl = 0
+        self.cache_max_size = 10 * 1024 * 1024
+        self.cache_refresh = False
 
     def load(self):
         config = configparser.ConfigParser()
         if not config.read(self.path):
             raise Exception("{} cannot be opened".format(self.path))
+        section = config[self.section]
 
         try:
-            self.epoch = datetime.datetime.strptime(
-                config["DEFAULT"]["epoch"], "%Y-%m-%d"
-            ).date()
-            self.week_period = int(config["DEFAULT"]["week_period"])
-            self.hadcoffee_file = config["DEFAULT"]["hadcoffee"]
-            self.channel = config["DEFAULT"]["channel"]
-            self.token = config["DEFAULT"]["token"]
-            self.hook = config["DEFAULT"]["hook"]
+            self.epoch = datetime.datetime.strptime(section["epoch"], "%Y-%m-%d").date()
+            self.week_period = int(section["week_period"])
+            self.hadcoffee_file = self._channel_path(
+                config, "hadcoffee", section["hadcoffee"]
+            )
+            self.channel = section["channel"]
+            self.token = section["token"]
+            self.hook = section["hook"]
         except Exception as error:
             raise Exception("Bad configuration file: {}".format(str(error)))
 
-        self.days_off = config["DEFAULT"].get("days_off", "").split()
-        self.skip_emoji_list = config["DEFAULT"].get("skip_emoji_list", "").split()
+        self.days_off = section.get("days_off", "").split()
+        self.holidays_files = section.get("holidays_files", "").split()
+        self.skip_emoji_list = section.get("skip_emoji_list", "").split()
+        self.api_url = section.get("api_url", self.api_url)
+        self.rate_limits = section.getboolean("rate_limits", self.rate_limits)
+        self.announce = section.get("announce", self.announce)
+        self.post_workers = section.getint("post_workers", self.post_workers)
+        self.fetch_workers = section.getint("fetch_workers", self.fetch_workers)
+        self.roster_strategy = section.get("roster_strategy", self.roster_strategy)
+        self.workspace_size = section.getint("workspace_size", self.workspace_size)
+        self.roster_db = section.get("roster_db", self.roster_db)
+        self.reconcile_days = section.getint("reconcile_days", self.reconcile_days)
+        self.signing_secret = section.get("signing_secret", self.signing_secret)
+        self.events_port = section.getint("events_port", self.events_port)
+        if "run_at" in section:
+            self.run_at = datetime.datetime.strptime(section["run_at"], "%H:%M").time()
+
+        self.state_backend = section.get("state_backend", self.state_backend)
+        self.state_db = self._channel_path(config, "state_db", self.state_db)
+
+        self.cache_dir = section.get("cache_dir", self.cache_dir)
+        self.cache_ttl = section.getint("cache_ttl", self.cache_ttl)
+        self.cache_max_size = section.getint("cache_max_size", self.cache_max_size)
+        self.cache_refresh = section.getboolean("cache_refresh", self.cache_refresh)
+
+        self.schedule_file = self._channel_path(config, "schedule", self.schedule_file)
+        self.group_size = section.getint("group_size", self.group_size)
+        self.skip_away = section.getboolean("skip_away", self.skip_away)
+        self.skip_dnd = section.getboolean("skip_dnd", self.skip_dnd)
+        self.presence_ttl = section.getint("presence_ttl", self.presence_ttl)
+        self.log_members = section.get("log_members", self.log_members)
+        self.log_sample = section.getint("log_sample", self.log_sample)
+        self.profile = section.getboolean("profile", self.profile)
+        self.profile_http = section.getboolean("profile_http", self.profile_http)
+        self.profile_dir = section.get("profile_dir", self.profile_dir) or None
+        if self.group_size < 2:
+            raise Exception("group_size must be at least 2")
+        self.metrics_json = self._channel_path(
+            config, "metrics_json", self.metrics_json
+        )
+        self.metrics_prom = self._channel_path(
+            config, "metrics_prom", self.metrics_prom
+        )
+
+    def _channel_path(self, config, option, default):
+        """ Return the path of option, made unique to the channel when it is
+        shared with the DEFAULT section: coffeeconnection.db becomes
+        coffeeconnection-<section>.db
+        """
+        section = config[self.section]
+        path = section.get(option, default) or None
+        if path is None or self.section == config.default_section:
+            return path
+        if section.get(option) == config.defaults().get(option):
+            root, ext = os.path.splitext(path)
+            path = "{}-{}{}".format(root, self.section, ext)
+        return path
+
+
+def load_channels():
+    """ Return the configuration of every channel
+    Each section of the configuration file is a channel, it inherits the values
+    of the DEFAULT section. Without section, DEFAULT is the only channel.
+    """
+    path = _get_config_path()
+    config = configparser.ConfigParser()
+    if not config.read(path):
+        raise Exception("{} cannot be opened".format(path))
+
+    channels = []
+    for name in config.sections() or ["DEFAULT"]:
+        channel = Configuration(section=name)
+        channel.load()
+        channels.append(channel)
+    return channels
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import asyncio
+import datetime
+
+from coffeeconnection.coffeeconnection import (
+    Slack,
+    Workspace,
+    coffeeconnection,
+    get_niceties,
+)
+from coffeeconnection.config import load_channels
+from coffeeconnection.logger import LOGGER, setup_logger
+
+# channels of the same workspace reuse the users fetched within this delay
+ROSTER_TTL = 600
+
+
+def seconds_until(run_at, now):
+    """ Number of seconds from now to the next run_at time
+    """
+    target = datetime.datetime.combine(now.date(), run_at)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def run_once(slack, config, niceties):
+    config.today = datetime.date.today()
+    LOGGER.info("coffee time for channel %s", config.channel)
+    try:
+        coffeeconnection(slack, config, niceties)
+    except Exception as error:
+        LOGGER.exception("Error in channel %s: %s", config.channel, str(error))
+
+
+async def run_channel(slack, config, niceties):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(seconds_until(config.run_at, datetime.datetime.now()))
+        await loop.run_in_executor(None, run_once, slack, config, niceties)
+
+
+def get_slacks(configs):
+    """ One Slack per channel, the channels with the same token share their
+    workspace
+    """
+    workspaces = {}
+    slacks = []
+    for config in configs:
+        if config.token not in workspaces:
+            workspaces[config.token] = Workspace(config, roster_ttl=ROSTER_TTL)
+        slacks.append(Slack(config, workspaces[config.token]))
+    return slacks
+
+
+async def serve(configs, niceties):
+    await asyncio.gather(
+        *[run_channel(slack, slack.config, niceties) for slack in get_slacks(configs)]
+    )
+
+
+def main():
+    setup_logger()
+
+    try:
+        configs = load_channels()
+        niceties = get_niceties()
+        LOGGER.info("serving %s channels", len(configs))
+        asyncio.run(serve(configs, niceties))
+        return 0
+    except KeyboardInterrupt:
+        return 0
+    except Exception as error:
+        LOGGER.exception("Error: %s", str(error))
+        return 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from coffeeconnection.coffeeconnection import Slack
+from coffeeconnection.config import Configuration
+from coffeeconnection.logger import LOGGER, setup_logger
+
+# Slack requests older than this are rejected to prevent replay attacks
+MAX_REQUEST_AGE = 5 * 60
+
+
+class RosterStore:
+    """ Members of the channels and availability of the users, updated by the
+    Slack events
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            deleted INTEGER NOT NULL,
+            is_bot INTEGER NOT NULL,
+            status_emoji TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS members (
+            channel TEXT NOT NULL,
+            user TEXT NOT NULL,
+            PRIMARY KEY (channel, user)
+        );
+        CREATE TABLE IF NOT EXISTS reconciled (
+            channel TEXT PRIMARY KEY,
+            time REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        import sqlite3
+
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.connection:
+            self.connection.executescript(self.SCHEMA)
+
+    def is_fresh(self, channel, max_age):
+        row = self.connection.execute(
+            "SELECT time FROM reconciled WHERE channel = ?", (channel,)
+        ).fetchone()
+        return row is not None and time.time() - row[0] < max_age
+
+    def channel_members(self, channel):
+        rows = self.connection.execute(
+            "SELECT user FROM members WHERE channel = ? ORDER BY user", (channel,)
+        )
+        return [row[0] for row in rows]
+
+    def channel_users(self, channel):
+        """ The known users of the channel, a member without user is available
+        """
+        rows = self.connection.execute(
+            "SELECT id, deleted, is_bot, status_emoji FROM users "
+            "JOIN members ON members.user = users.id WHERE members.channel = ?",
+            (channel,),
+        )
+        return [
+            {
+                "id": row[0],
+                "deleted": bool(row[1]),
+                "is_bot": bool(row[2]),
+                "status_emoji": row[3],
+            }
+            for row in rows
+        ]
+
+    def _set_user(self, user):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO users (id, deleted, is_bot, status_emoji) "
+            "VALUES (?, ?, ?, ?)",
+            (user["id"], user["deleted"], user["is_bot"], user["status_emoji"]),
+        )
+
+    def reconcile(self, channel, members, users):
+        """ Replace what is known of the channel by the API view of it
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM members WHERE channel = ?", (channel,))
+            self.connection.executemany(
+                "INSERT INTO members (channel, user) VALUES (?, ?)",
+                [(channel, member) for member in members],
+            )
+            for user in users:
+                self._set_user(user)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO reconciled (channel, time) VALUES (?, ?)",
+                (channel, time.time()),
+            )
+
+    def apply(self, event):
+        """ Update the store with a Slack event
+        """
+        kind = event.get("type")
+        with self.lock, self.connection:
+            if kind == "member_joined_channel":
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO members (channel, user) VALUES (?, ?)",
+                    (event["channel"], event["user"]),
+                )
+            elif kind == "member_left_channel":
+                self.connection.execute(
+                    "DELETE FROM members WHERE channel = ? AND user = ?",
+                    (event["channel"], event["user"]),
+                )
+            elif kind == "user_change":
+                self._set_user(Slack._slim_user(event["user"]))
+            else:
+                LOGGER.debug("ignore event %s", kind)
+                return
+        LOGGER.info("apply event %s", kind)
+
+    def close(self):
+        self.connection.close()
+
+
+def verify_signature(secret, timestamp, body, signature, now=None):
+    """ Check a request really comes from Slack
+    https://api.slack.com/authentication/verifying-requests-from-slack
+    """
+    now = time.time() if now is None else now
+    try:
+        if abs(now - int(timestamp)) > MAX_REQUEST_AGE:
+            return False
+    except (TypeError, ValueError):
+        return False
+    basestring = b"v0:" + timestamp.encode("utf-8") + b":" + body
+    digest = hmac.new(secret.encode("utf-8"), basestring, hashlib.sha256)
+    return hmac.compare_digest("v0=" + digest.hexdigest(), signature or "")
+
+
+class EventHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        LOGGER.debug(format, *args)
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        secret = self.server.signing_secret
+        if secret is not None and not verify_signature(
+            secret,
+            self.headers.get("X-Slack-Request-Timestamp"),
+            body,
+            self.headers.get("X-Slack-Signature"),
+        ):
+            LOGGER.warning("reject request with a bad signature")
+            self._reply(401)
+            return
+
+        try:
+            payload = json.loads(body.decode("utf-8"))
+        except ValueError:
+            self._reply(400)
+            return
+
+        if payload.get("type") == "url_verification":
+            self._reply(200, payload.get("challenge", "").encode("utf-8"))
+            return
+        if payload.get("type") == "event_callback":
+            self.server.store.apply(payload.get("event", {}))
+        self._reply(200)
+
+
+class EventServer(HTTPServer):
+    """ Receive the Slack Events API requests and apply them to the store
+    """
+
+    def __init__(self, address, store, signing_secret=None):
+        super().__init__(address, EventHandler)
+        self.store = store
+        self.signing_secret = signing_secret
+
+
+def main():
+    setup_logger()
+
+    try:
+        config = Configuration()
+        config.load()
+        if config.signing_secret is None:
+            # anyone could rewrite the roster with unsigned requests
+            raise Exception("signing_secret is required to listen to slack events")
+        store = RosterStore(config.roster_db)
+        server = EventServer(("", config.events_port), store, config.signing_secret)
+        LOGGER.info("listen to slack events on port %s", config.events_port)
+        server.serve_forever()
+        return 0
+    except KeyboardInterrupt:
+        return 0
+    except Exception as error:
+        LOGGER.exception("Error: %s", str(error))
+        return 1
+
+
+if __name__ == "__main__":
+    main()
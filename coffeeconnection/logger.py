@@ -1,15 +1,33 @@
 import logging
 import sys
+from itertools import islice
 
 LOGGER = logging.getLogger()
 
+# the log file is rotated when it reaches LOG_MAX_SIZE bytes, LOG_BACKUPS
+# former files are kept
+LOG_MAX_SIZE = 1024 * 1024
+LOG_BACKUPS = 5
+
+
+def setup_logger(path=None):
+    """ Log to a rotating file and to the console
+    The records are written by a background thread, logging never waits for
+    the disk or the terminal.
+    """
+    import atexit
+    import queue
+    from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+    from coffeeconnection.config import get_log_path
 
-def setup_logger():
     logger = LOGGER
     logger.setLevel(logging.DEBUG)
 
     # File logger
-    file_handler = logging.FileHandler("coffeeconnection.log")
+    file_handler = RotatingFileHandler(
+        path or get_log_path(), maxBytes=LOG_MAX_SIZE, backupCount=LOG_BACKUPS
+    )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(
         logging.Formatter("%(asctime)s %(levelname)s %(message)s")
@@ -19,5 +37,25 @@ def setup_logger():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(logging.Formatter("%(message)s"))
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    records = queue.SimpleQueue()
+    listener = QueueListener(
+        records, file_handler, console_handler, respect_handler_level=True
+    )
+    logger.addHandler(QueueHandler(records))
+    listener.start()
+    # flush the pending records at exit
+    atexit.register(listener.stop)
+    return listener
+
+
+def log_members(message, members, detail="summary", sample=5):
+    """ Log the members with message: one line per member when detail is
+    "all", else their number and the first `sample` of them
+    """
+    if detail == "all":
+        for member in members:
+            LOGGER.info("%s %s", member, message)
+        return
+    LOGGER.info("%s members %s", len(members), message)
+    if members and sample > 0:
+        LOGGER.debug("%s: %s", message, " ".join(islice(members, sample)))
@@ -0,0 +1,94 @@
+import math
+from collections import Counter
+from itertools import combinations
+
+# number of candidates a player considers before settling for a known partner
+WINDOW = 32
+
+
+def _key(member, other):
+    return (member, other) if member < other else (other, member)
+
+
+class PairHistory:
+    """ Number of coffees each pair of members already had together
+    """
+
+    def __init__(self, counts=()):
+        self.counts = Counter()
+        for member, other, count in counts:
+            self.counts[_key(member, other)] += count
+
+    def add(self, member, other):
+        self.counts[_key(member, other)] += 1
+
+    def count(self, member, other):
+        return self.counts.get(_key(member, other), 0)
+
+    def __len__(self):
+        return len(self.counts)
+
+
+def pair_players(players, history, window=WINDOW):
+    """ Pair the (already shuffled) players, avoiding repeated pairs
+    Each player takes, among the next `window` players, the first one it never
+    met or else the one it met the least. This is linear in the number of
+    players.
+    return a list of tuple, the odd player is left in players
+    """
+    matches = []
+    while len(players) >= 2:
+        player = players.pop()
+        best = len(players) - 1
+        best_count = history.count(player, players[best])
+        for index in range(best - 1, max(best - window, -1), -1):
+            if best_count == 0:
+                break
+            count = history.count(player, players[index])
+            if count < best_count:
+                best, best_count = index, count
+        players[best], players[-1] = players[-1], players[best]
+        matches.append((player, players.pop()))
+    return matches
+
+
+def group_pairs(group):
+    """ Every pair of members of a group, who all had a coffee together
+    """
+    return combinations(group, 2)
+
+
+def group_sizes(nbplayers, size):
+    """ Sizes of the groups of at most `size` players, as even as possible
+    There is never a group of one when there are at least 2 players.
+    """
+    if nbplayers < 2:
+        return []
+    nbgroups = math.ceil(nbplayers / size)
+    small, extra = divmod(nbplayers, nbgroups)
+    return [small + 1] * extra + [small] * (nbgroups - extra)
+
+
+def group_players(players, history, size, window=WINDOW):
+    """ Split the (already shuffled) players in groups of at most `size`
+    Each group starts with the last player, its next member is, among the next
+    `window` players, the first one who never met the group or else the one
+    who met it the least. This is linear in the number of players.
+    return a list of tuple, players is emptied unless there is only one
+    """
+    groups = []
+    for group_size in group_sizes(len(players), size):
+        group = [players.pop()]
+        while len(group) < group_size:
+            best = len(players) - 1
+            best_count = sum(history.count(member, players[best]) for member in group)
+            for index in range(best - 1, max(best - window, -1), -1):
+                if best_count == 0:
+                    break
+                count = sum(history.count(member, players[index]) for member in group)
+                if count < best_count:
+                    best, best_count = index, count
+            players[best], players[-1] = players[-1], players[best]
+            group.append(players.pop())
+        groups.append(tuple(group))
+    return groups
@@ -0,0 +1,112 @@
+import random
+from array import array
+
+
+class Member:
+    """ A member of the channel, index is its interned id
+    """
+
+    __slots__ = ("id", "index")
+
+    def __init__(self, member_id, index):
+        self.id = member_id
+        self.index = index
+
+
+class Members:
+    """ Ordered set of member ids
+    Every id is interned to a small int, the position of each member in the
+    dense list is kept in an array indexed by it (-1 when it is not there), so
+    membership, removal (the last member takes the place of the removed one)
+    and random sampling are O(1). The order is kept until a member is removed.
+    """
+
+    __slots__ = ("interned", "dense", "positions")
+
+    def __init__(self, ids=()):
+        self.interned = {}
+        self.dense = []
+        self.positions = array("l")
+        for member_id in ids:
+            self.add(member_id)
+
+    def _intern(self, member_id):
+        member = self.interned.get(member_id)
+        if member is None:
+            member = Member(member_id, len(self.positions))
+            self.interned[member_id] = member
+            self.positions.append(-1)
+        return member
+
+    def add(self, member_id):
+        member = self._intern(member_id)
+        if self.positions[member.index] < 0:
+            self.positions[member.index] = len(self.dense)
+            self.dense.append(member)
+
+    def discard(self, member_id):
+        member = self.interned.get(member_id)
+        if member is None or self.positions[member.index] < 0:
+            return
+        position = self.positions[member.index]
+        last = self.dense.pop()
+        if last is not member:
+            self.dense[position] = last
+            self.positions[last.index] = position
+        self.positions[member.index] = -1
+
+    def take(self, count):
+        """ Remove and return the ids of the last count members, or of all of
+        them when there are fewer
+        """
+        count = min(count, len(self.dense))
+        taken = self.dense[len(self.dense) - count :]
+        del self.dense[len(self.dense) - count :]
+        for member in taken:
+            self.positions[member.index] = -1
+        return [member.id for member in taken]
+
+    def sample(self, exclude=None):
+        """ A random member id other than exclude
+        """
+        if len(self.dense) - (exclude in self) < 1:
+            raise IndexError("no member to sample")
+        while True:
+            member_id = random.choice(self.dense).id
+            if member_id != exclude:
+                return member_id
+
+    def shuffle(self):
+        random.shuffle(self.dense)
+        for position, member in enumerate(self.dense):
+            self.positions[member.index] = position
+
+    def copy(self):
+        members = Members()
+        members.interned = dict(self.interned)
+        members.dense = list(self.dense)
+        members.positions = array("l", self.positions)
+        return members
+
+    def __contains__(self, member_id):
+        member = self.interned.get(member_id)
+        return member is not None and self.positions[member.index] >= 0
+
+    def __len__(self):
+        return len(self.dense)
+
+    def __iter__(self):
+        return (member.id for member in self.dense)
+
+    def __getitem__(self, position):
+        return self.dense[position].id
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "Members({!r})".format(list(self))
+
+
+def as_members(ids):
+    return ids if isinstance(ids, Members) else Members(ids)
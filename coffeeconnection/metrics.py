@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """ Time spent per phase and counters of a run
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.start = time.time()
+            self.phases = {}
+            self.counters = {}
+
+    @contextmanager
+    def span(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                calls, seconds = self.phases.get(phase, (0, 0))
+                self.phases[phase] = (calls + 1, seconds + elapsed)
+
+    def inc(self, counter, value=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def summary(self, channel):
+        with self.lock:
+            return {
+                "channel": channel,
+                "start": self.start,
+                "duration": time.time() - self.start,
+                "phases": {
+                    phase: {"calls": calls, "seconds": seconds}
+                    for phase, (calls, seconds) in self.phases.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    def prometheus(self, channel):
+        """ Metrics in the Prometheus text format
+        """
+        summary = self.summary(channel)
+        label = 'channel="{}"'.format(channel)
+        lines = [
+            "# HELP coffeeconnection_last_run_timestamp_seconds Start of the last run",
+            "# TYPE coffeeconnection_last_run_timestamp_seconds gauge",
+            "coffeeconnection_last_run_timestamp_seconds{{{}}} {}".format(
+                label, summary["start"]
+            ),
+            "# HELP coffeeconnection_run_seconds Duration of the last run",
+            "# TYPE coffeeconnection_run_seconds gauge",
+            "coffeeconnection_run_seconds{{{}}} {}".format(label, summary["duration"]),
+            "# HELP coffeeconnection_phase_seconds Time spent per phase",
+            "# TYPE coffeeconnection_phase_seconds gauge",
+        ]
+        for phase, data in sorted(summary["phases"].items()):
+            lines.append(
+                'coffeeconnection_phase_seconds{{{},phase="{}"}} {}'.format(
+                    label, phase, data["seconds"]
+                )
+            )
+        lines += [
+            "# HELP coffeeconnection_phase_calls Number of calls per phase",
+            "# TYPE coffeeconnection_phase_calls gauge",
+        ]
+        for phase, data in sorted(summary["phases"].items()):
+            lines.append(
+                'coffeeconnection_phase_calls{{{},phase="{}"}} {}'.format(
+                    label, phase, data["calls"]
+                )
+            )
+        for counter, value in sorted(summary["counters"].items()):
+            lines += [
+                "# TYPE coffeeconnection_{} gauge".format(counter),
+                "coffeeconnection_{}{{{}}} {}".format(counter, label, value),
+            ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, config):
+        if config.metrics_json:
+            _write(
+                config.metrics_json, json.dumps(self.summary(config.channel), indent=2)
+            )
+        if config.metrics_prom:
+            _write(config.metrics_prom, self.prometheus(config.channel))
+
+
+def _write(path, content):
+    """ Replace the file at once, the node exporter never reads half of it
+    """
+    tmp = "{}.tmp".format(path)
+    with open(tmp, "w") as fp:
+        fp.write(content)
+    os.replace(tmp, path)
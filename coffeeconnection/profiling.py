@@ -0,0 +1,132 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+# number of functions and allocation sites in the report
+TOP = 20
+
+
+def percentile(values, fraction):
+    """ The value under which `fraction` of the sorted values are
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Profiler:
+    """ CPU profile, memory allocations and HTTP latencies of a run
+    It writes in directory a .prof file, to read with pstats or snakeviz, and
+    a report with the peak memory, the top functions and allocation sites and
+    the latency of every HTTP call.
+    cProfile only sees the thread which enables it, the threads started during
+    the run (users.info and webhook pools) get their own profile, merged with
+    the one of the main thread.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = "coffeeconnection-{}".format(time.strftime("%Y%m%d-%H%M%S"))
+        self.profile = cProfile.Profile()
+        self.thread_profiles = []
+        self.lock = threading.Lock()
+        self.calls = []
+        self.start = None
+
+    @property
+    def profile_path(self):
+        return os.path.join(self.directory, self.name + ".prof")
+
+    @property
+    def report_path(self):
+        return os.path.join(self.directory, self.name + ".txt")
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        tracemalloc.start()
+        threading.setprofile(self._profile_thread)
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.profile.disable()
+        threading.setprofile(None)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = self.stats()
+        stats.dump_stats(self.profile_path)
+        with open(self.report_path, "w") as fp:
+            stats.stream = fp
+            self.write_report(fp, snapshot, peak, stats)
+
+    def _profile_thread(self, frame, event, arg):
+        """ threading.setprofile hook, called once in every new thread
+        """
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python >= 3.12: the profile of the main thread sees every thread
+            return
+        with self.lock:
+            self.thread_profiles.append(profile)
+
+    def stats(self):
+        """ The profile of the main thread merged with the ones of the threads
+        """
+        stats = pstats.Stats(self.profile)
+        with self.lock:
+            profiles = list(self.thread_profiles)
+        for profile in profiles:
+            profile.create_stats()
+            if profile.stats:
+                stats.add(profile)
+        return stats
+
+    def record(self, method, seconds, status, size):
+        """ Record an HTTP call which took `seconds` and returned `size` bytes
+        """
+        offset = time.perf_counter() - self.start - seconds
+        with self.lock:
+            self.calls.append((offset, method, seconds, status, size))
+
+    def write_report(self, fp, snapshot, peak, stats):
+        fp.write("peak memory: {:.1f} MiB\n\n".format(peak / 1024 / 1024))
+
+        fp.write("top allocations:\n")
+        for stat in snapshot.statistics("lineno")[:TOP]:
+            fp.write("{}\n".format(stat))
+
+        fp.write("\ntop functions:\n")
+        stats.sort_stats("cumulative").print_stats(TOP)
+
+        fp.write("HTTP calls:\n")
+        fp.write("method calls total mean p50 p95 max bytes\n")
+        methods = {}
+        for _, method, seconds, _, size in self.calls:
+            latencies, received = methods.get(method, ([], 0))
+            latencies.append(seconds)
+            methods[method] = (latencies, received + size)
+        for method, (latencies, received) in sorted(methods.items()):
+            latencies.sort()
+            fp.write(
+                "{} {} {:.3f} {:.3f} {:.3f} {:.3f} {:.3f} {}\n".format(
+                    method,
+                    len(latencies),
+                    sum(latencies),
+                    sum(latencies) / len(latencies),
+                    percentile(latencies, 0.5),
+                    percentile(latencies, 0.95),
+                    latencies[-1],
+                    received,
+                )
+            )
+
+        fp.write("\nevery HTTP call:\n")
+        fp.write("offset method seconds status bytes\n")
+        for call in sorted(self.calls):
+            fp.write("{:.3f} {} {:.3f} {} {}\n".format(*call))
@@ -0,0 +1,169 @@
+import threading
+import time
+
+from coffeeconnection.logger import LOGGER
+
+# Slack Web API rate limit tiers, in requests per minute
+# https://api.slack.com/docs/rate-limits
+TIER_1 = 1
+TIER_2 = 20
+TIER_3 = 50
+TIER_4 = 100
+
+METHOD_TIERS = {
+    "users.list": TIER_2,
+    "users.info": TIER_4,
+    "conversations.members": TIER_4,
+    "users.getPresence": TIER_3,
+    "dnd.teamInfo": TIER_2,
+    # incoming webhooks accept about one message per second
+    "webhook": 60,
+}
+DEFAULT_TIER = TIER_3
+
+# their limit is per channel (its incoming webhook) instead of per workspace
+CHANNEL_METHODS = ("webhook",)
+
+# wait used when a 429 response has no Retry-After header
+DEFAULT_RETRY_AFTER = 1
+
+# successful calls needed to get back to the tier rate from a halved one
+RECOVERY_CALLS = 10
+
+
+def request_cost(method, calls):
+    """ Minimum number of minutes needed to call `method` `calls` times
+    """
+    return calls / METHOD_TIERS.get(method, DEFAULT_TIER)
+
+
+class TokenBucket:
+    """ Allow `per_minute` calls every minute, with bursts of up to one
+    minute worth of calls
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic):
+        self.tier_rate = per_minute / 60
+        self.rate = self.tier_rate
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.clock = clock
+        self.last = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """ Take a token and return how long to wait before using it
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last) * self.rate
+            )
+            self.last = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def slow_down(self):
+        """ Halve the rate after Slack rate limited us anyway
+        """
+        with self.lock:
+            self.rate = max(self.rate / 2, 1 / 60)
+            self.tokens = min(self.tokens, 0)
+
+    def speed_up(self):
+        """ Get back to the tier rate, step by step, after a successful call
+        """
+        if self.rate < self.tier_rate:
+            with self.lock:
+                step = self.tier_rate / 2 / RECOVERY_CALLS
+                self.rate = min(self.rate + step, self.tier_rate)
+
+
+class RequestScheduler:
+    """ Schedule the calls to Slack with one token bucket per API method and
+    retry the rate limited (429) ones after their Retry-After delay
+    When disabled, the calls are not spaced out but 429 are still retried.
+    The scheduler of a channel takes the buckets of the Web API methods from
+    the scheduler of its workspace, the other channels of the workspace share
+    them, but it keeps its own webhook bucket and throttled time.
+    """
+
+    def __init__(
+        self,
+        max_retries=5,
+        sleep=time.sleep,
+        clock=time.monotonic,
+        enabled=True,
+        workspace=None,
+    ):
+        self.enabled = enabled
+        self.workspace = workspace
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.clock = clock
+        self.buckets = {}
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def bucket(self, method):
+        if self.workspace is not None and method not in CHANNEL_METHODS:
+            return self.workspace.bucket(method)
+        with self.lock:
+            if method not in self.buckets:
+                per_minute = METHOD_TIERS.get(method, DEFAULT_TIER)
+                self.buckets[method] = TokenBucket(per_minute, clock=self.clock)
+            return self.buckets[method]
+
+    def _throttle(self, method, delay):
+        if delay <= 0:
+            return 0
+        LOGGER.debug("%s throttled for %.2fs", method, delay)
+        with self.lock:
+            self.throttled += delay
+        return delay
+
+    def _retry_after(self, method, bucket, response):
+        bucket.slow_down()
+        retry_after = response.headers.get("Retry-After", DEFAULT_RETRY_AFTER)
+        LOGGER.warning("%s rate limited, retry after %ss", method, retry_after)
+        return float(retry_after)
+
+    def wait(self, method, delay):
+        if self._throttle(method, delay):
+            self.sleep(delay)
+
+    def call(self, method, request):
+        """ Call `request` when `method` is allowed to, return its response
+        """
+        bucket = self.bucket(method)
+        for _ in range(self.max_retries):
+            if self.enabled:
+                self.wait(method, bucket.reserve())
+            response = request()
+            if response.status_code != 429:
+                bucket.speed_up()
+                return response
+            self.wait(method, self._retry_after(method, bucket, response))
+        return request()
+
+    async def await_call(self, method, request):
+        """ Same as call, `request` is a coroutine function
+        """
+        import asyncio
+
+        bucket = self.bucket(method)
+        for _ in range(self.max_retries):
+            if self.enabled:
+                delay = self._throttle(method, bucket.reserve())
+                if delay:
+                    await asyncio.sleep(delay)
+            response = await request()
+            if response.status_code != 429:
+                bucket.speed_up()
+                return response
+            delay = self._throttle(method, self._retry_after(method, bucket, response))
+            if delay:
+                await asyncio.sleep(delay)
+        return await request()
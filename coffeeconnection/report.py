@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import os
+import sys
+
+from coffeeconnection.config import Configuration
+from coffeeconnection.state import SqliteState
+
+
+def coverage(state, args):
+    return [
+        {"period": period, "members": members, "pairs": pairs}
+        for period, members, pairs in state.coverage()
+    ]
+
+
+def repeats(state, args):
+    return [
+        {"coffees": coffees, "pairs": pairs}
+        for coffees, pairs in state.repeat_frequency()
+    ]
+
+
+def members(state, args):
+    before = None
+    if args.idle_days is not None:
+        before = datetime.date.today() - datetime.timedelta(days=args.idle_days)
+    return [
+        {
+            "member": member,
+            "coffees": coffees,
+            "periods": periods,
+            "first_day": first_day,
+            "last_day": last_day,
+        }
+        for member, coffees, periods, first_day, last_day in state.participation(before)
+    ]
+
+
+def pair(state, args):
+    coffees, last_day = state.met(args.member, args.partner)
+    return [
+        {
+            "member": args.member,
+            "partner": args.partner,
+            "coffees": coffees,
+            "last_day": last_day,
+        }
+    ]
+
+
+FORMATS = {
+    "coverage": "period {period}: {members} members, {pairs} pairs",
+    "repeats": "{pairs} pairs had {coffees} coffees together",
+    "members": "{member}: {coffees} coffees in {periods} periods, "
+    "from {first_day} to {last_day}",
+    "pair": "{member} and {partner}: {coffees} coffees, the last on {last_day}",
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report on the pairing history kept by the sqlite backend"
+    )
+    parser.add_argument(
+        "--db", help="state database, state_db of the configuration by default"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    coverage_parser = commands.add_parser(
+        "coverage", help="members and pairs per period"
+    )
+    coverage_parser.set_defaults(report=coverage)
+    repeats_parser = commands.add_parser(
+        "repeats", help="how many pairs met once, twice..."
+    )
+    repeats_parser.set_defaults(report=repeats)
+    members_parser = commands.add_parser(
+        "members", help="participation of every member, the least recent first"
+    )
+    members_parser.add_argument(
+        "--idle-days",
+        type=int,
+        help="only the members without a coffee for this many days",
+    )
+    members_parser.set_defaults(report=members)
+    pair_parser = commands.add_parser("pair", help="how often two members met")
+    pair_parser.add_argument("member")
+    pair_parser.add_argument("partner")
+    pair_parser.set_defaults(report=pair)
+    args = parser.parse_args(argv)
+
+    path = args.db
+    if path is None:
+        config = Configuration()
+        config.load()
+        if config.state_backend != "sqlite":
+            print("the history is only kept by state_backend = sqlite", file=sys.stderr)
+            return 1
+        path = config.state_db
+
+    if not os.path.exists(path):
+        print("no history in {}".format(path), file=sys.stderr)
+        return 1
+    state = SqliteState(path)
+    try:
+        rows = args.report(state, args)
+    finally:
+        state.close()
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            print(FORMATS[args.command].format(**row))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
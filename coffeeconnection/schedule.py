@@ -0,0 +1,100 @@
+import json
+import os
+import random
+
+from coffeeconnection.matching import group_players, pair_players
+
+
+class Schedule:
+    """ Couples planned for every working day of a period
+    The whole period is planned at once, each day then announces its couples,
+    patched for the members who left or joined since. A member who is not in
+    the schedule and had no coffee yet waits to be paired with another one.
+    The schedule is saved as JSON, it can be read to preview the period.
+    """
+
+    def __init__(self, period, days=None):
+        self.period = period
+        # "YYYY-MM-DD" -> list of couples
+        self.days = days if days is not None else {}
+
+    @classmethod
+    def plan(cls, period, members, days, history, group_size=2):
+        """ Pair or group the members, the couples are spread evenly over the
+        days
+        """
+        players = list(members)
+        random.shuffle(players)
+        couples = match_players(players, history, group_size)
+        schedule = cls(period)
+        for index, day in enumerate(days):
+            start = index * len(couples) // len(days)
+            end = (index + 1) * len(couples) // len(days)
+            schedule.days[day.isoformat()] = couples[start:end]
+        return schedule
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        with open(path) as fp:
+            data = json.load(fp)
+        days = {
+            day: [tuple(couple) for couple in couples]
+            for day, couples in data["days"].items()
+        }
+        return cls(data["period"], days)
+
+    def save(self, path):
+        tmp = "{}.tmp".format(path)
+        with open(tmp, "w") as fp:
+            json.dump({"period": self.period, "days": self.days}, fp, indent=1)
+        os.replace(tmp, path)
+
+    def take(self, day):
+        """ Remove and return the couples planned up to day
+        """
+        day = day.isoformat()
+        couples = []
+        for planned in sorted(self.days):
+            if planned <= day:
+                couples.extend(self.days.pop(planned))
+        return couples
+
+    def members(self):
+        return {
+            member
+            for couples in self.days.values()
+            for couple in couples
+            for member in couple
+        }
+
+    def today(self, day, members, hadcoffee, history, group_size=2):
+        """ The couples of the day, the couples of a member who is not
+        available any more are broken and the remaining members are paired
+        with the waiting ones
+        return the couples and the members still waiting
+        """
+        available = {member for member in members if member not in hadcoffee}
+        matches = []
+        waiting = []
+        for couple in self.take(day):
+            present = tuple(member for member in couple if member in available)
+            if len(present) >= 2:
+                matches.append(present)
+            else:
+                waiting.extend(present)
+
+        busy = self.members().union(*matches, waiting)
+        waiting.extend(
+            member for member in members if member not in busy and member in available
+        )
+        random.shuffle(waiting)
+        matches.extend(match_players(waiting, history, group_size))
+        return matches, waiting
+
+
+def match_players(players, history, group_size):
+    if group_size > 2:
+        return group_players(players, history, group_size)
+    return pair_players(players, history)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import logging
+import random
+import time
+
+from coffeeconnection import members as members_module
+from coffeeconnection.coffeeconnection import Slack, run
+from coffeeconnection.config import Configuration
+from coffeeconnection.matching import PairHistory
+from coffeeconnection.workdays import WorkCalendar
+
+# status of the absent members, skipped through skip_emoji_list
+ABSENCE_EMOJI = ":palm_tree:"
+
+
+class Roster:
+    """ Synthetic channel: members join, leave and set an absence status
+    """
+
+    def __init__(self, size, join_rate, leave_rate, absence_rate, rng):
+        self.rng = rng
+        self.join_rate = join_rate
+        self.leave_rate = leave_rate
+        self.absence_rate = absence_rate
+        self.next_id = 0
+        self.members = []
+        self.absent = set()
+        for _ in range(size):
+            self.join()
+
+    def join(self):
+        self.members.append("U{:06d}".format(self.next_id))
+        self.next_id += 1
+
+    def leave(self):
+        index = self.rng.randrange(len(self.members))
+        self.members[index] = self.members[-1]
+        self.members.pop()
+
+    def new_day(self):
+        if self.rng.random() < self.join_rate:
+            self.join()
+        if self.members and self.rng.random() < self.leave_rate:
+            self.leave()
+        self.absent = {
+            member for member in self.members if self.rng.random() < self.absence_rate
+        }
+
+    def users(self):
+        return [
+            {
+                "id": member,
+                "deleted": False,
+                "is_bot": False,
+                "status_emoji": ABSENCE_EMOJI if member in self.absent else "",
+            }
+            for member in self.members
+        ]
+
+    def available(self):
+        return [member for member in self.members if member not in self.absent]
+
+
+class SimulatedSlack(Slack):
+    """ Stand-in for Slack, the members are filtered like the real ones but
+    it announces nothing and remembers the couples
+    """
+
+    def __init__(self, config, roster):
+        super().__init__(config)
+        self.roster = roster
+        self.couples = []
+
+    def _get_slack_members(self):
+        return self.filter_members(self.roster.members, self.roster.users())
+
+    def match(self, couple, niceties):
+        self.couples.append(couple)
+
+    def announce(self, couples, niceties, callback=None):
+        for couple in couples:
+            self.match(couple, niceties)
+            if callback is not None:
+                callback(couple)
+        return list(couples), []
+
+
+class MemoryState:
+    """ State backend kept in memory, with the whole pairing history
+    """
+
+    def __init__(self):
+        self.hadcoffee = {}
+        self.history = PairHistory()
+
+    def reset(self, period):
+        pass
+
+    def load(self, period):
+        return self.hadcoffee.setdefault(period, set())
+
+    def record(self, couples, period, day):
+        hadcoffee = self.load(period)
+        for couple in couples:
+            hadcoffee.update(couple)
+            self.history.add(*couple)
+
+    def pair_history(self):
+        return self.history
+
+    def close(self):
+        pass
+
+
+def simulate(
+    members=50,
+    periods=4,
+    week_period=1,
+    join_rate=0.1,
+    leave_rate=0.05,
+    absence_rate=0.05,
+    seed=None,
+):
+    """ Run the matching logic over `periods` periods of a synthetic channel
+    return one report per period
+    """
+    rng = random.Random(seed)
+    roster = Roster(members, join_rate, leave_rate, absence_rate, rng)
+    state = MemoryState()
+
+    config = Configuration()
+    config.epoch = datetime.date(2018, 6, 11)
+    config.week_period = week_period
+    config.skip_emoji_list = [ABSENCE_EMOJI]
+    slack = SimulatedSlack(config, roster)
+    calendar = WorkCalendar(config.epoch, week_period)
+    seen_pairs = PairHistory()
+
+    reports = []
+    previous = logging.root.manager.disable
+    logging.disable(logging.INFO)
+    # the matching draws from the random module of members, it uses the
+    # local generator meanwhile: the global one is neither seeded nor consumed
+    members_module.random = rng
+    try:
+        for period in range(periods):
+            report = {
+                "period": period,
+                "members": 0,
+                "covered": 0,
+                "coverage": 0.0,
+                "pairs": 0,
+                "repeated_pairs": 0,
+                "repeat_rate": 0.0,
+                "alone": 0,
+                "days": 0,
+                "seconds_per_day": 0.0,
+            }
+            present = set()
+            count = {}
+            elapsed = 0
+            for offset in range(week_period * 7):
+                config.today = config.epoch + datetime.timedelta(
+                    days=period * week_period * 7 + offset
+                )
+                roster.new_day()
+                slack.couples = []
+
+                start = time.perf_counter()
+                run(slack, config, [""], state)
+                if calendar.is_off(config.today):
+                    continue
+                elapsed += time.perf_counter() - start
+                report["days"] += 1
+                present.update(roster.available())
+
+                for couple in slack.couples:
+                    report["pairs"] += 1
+                    if seen_pairs.count(*couple):
+                        report["repeated_pairs"] += 1
+                    seen_pairs.add(*couple)
+                    for member in couple:
+                        count[member] = count.get(member, 0) + 1
+
+            report["members"] = len(present)
+            report["covered"] = len(present.intersection(count))
+            report["alone"] = sum(1 for nb in count.values() if nb > 1)
+            if present:
+                report["coverage"] = report["covered"] / len(present)
+            if report["pairs"]:
+                report["repeat_rate"] = report["repeated_pairs"] / report["pairs"]
+            if report["days"]:
+                report["seconds_per_day"] = elapsed / report["days"]
+            reports.append(report)
+    finally:
+        members_module.random = random
+        logging.disable(previous)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate coffeeconnection over a synthetic channel"
+    )
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--periods", type=int, default=4)
+    parser.add_argument("--week-period", type=int, default=1)
+    parser.add_argument("--join-rate", type=float, default=0.1)
+    parser.add_argument("--leave-rate", type=float, default=0.05)
+    parser.add_argument("--absence-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print JSON reports")
+    args = parser.parse_args()
+
+    reports = simulate(
+        members=args.members,
+        periods=args.periods,
+        week_period=args.week_period,
+        join_rate=args.join_rate,
+        leave_rate=args.leave_rate,
+        absence_rate=args.absence_rate,
+        seed=args.seed,
+    )
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print(
+                "period {period}: {covered}/{members} covered ({coverage:.0%}), "
+                "{pairs} pairs, {repeat_rate:.0%} repeated, {alone} alone, "
+                "{seconds_per_day:.6f}s per day".format(**report)
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+import json
+import os
+
+from coffeeconnection.matching import PairHistory, group_pairs
+
+
+def get_period(today, epoch, week_period):
+    """ Index of the week_period containing today, counted from epoch
+    """
+    return (today - epoch).days // (week_period * 7)
+
+
+def get_already_had_coffee_members(filepath):
+    hadcoffee = []
+    with open(filepath) as fp:
+        hadcoffee = [line.strip() for line in fp.readlines()]
+    return hadcoffee
+
+
+class TextFileState:
+    """ Historical state backend: one member id per line, truncated at every
+    period reset
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def reset(self, period):
+        open(self.path, "w").close()
+
+    def load(self, period):
+        if not os.path.exists(self.path):
+            return set()
+        return set(get_already_had_coffee_members(self.path))
+
+    def record(self, couples, period, day):
+        with open(self.path, "a") as fp:
+            for couple in couples:
+                for coffied in couple:
+                    fp.write("{}\n".format(coffied))
+
+    def pair_history(self):
+        # the text file does not know who had a coffee with whom
+        return PairHistory()
+
+    def close(self):
+        pass
+
+
+class JournalState:
+    """ State backend appending every announced couple to a journal
+
+    Each line is "period day member partner", written and fsynced as soon as
+    the couple is announced so a crash never loses an announcement. At every
+    period reset the journal is compacted into a snapshot holding the number
+    of coffees per pair, startup only reads this snapshot and the journal of
+    the running period.
+    Lines with a single member id, from the former file format, count for the
+    running period.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot_path = "{}.snapshot".format(path)
+        self.entries = None
+        self.snapshot = None
+
+    def _read_snapshot(self):
+        if self.snapshot is None:
+            self.snapshot = {"period": None, "pairs": []}
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path) as fp:
+                    self.snapshot = json.load(fp)
+        return self.snapshot
+
+    def _read_entries(self):
+        """ Return the journal entries not yet compacted as
+        (period, member, partner), period is None for the former file format
+        """
+        if self.entries is None:
+            compacted = self._read_snapshot()["period"]
+            self.entries = []
+            if os.path.exists(self.path):
+                with open(self.path) as fp:
+                    for line in fp:
+                        fields = line.split()
+                        if len(fields) == 1 and line.endswith("\n"):
+                            self.entries.append((None, fields[0], None))
+                        elif len(fields) == 4 and line.endswith("\n"):
+                            period = int(fields[0])
+                            if compacted is None or period >= compacted:
+                                self.entries.append((period, fields[2], fields[3]))
+                        # else a partial line left by a crash
+        return self.entries
+
+    def reset(self, period):
+        compacted = self._read_snapshot()["period"]
+        if compacted is not None and compacted >= period:
+            # already done by a former run of the day, the journal holds its
+            # couples
+            return
+        history = self.pair_history()
+        snapshot = {
+            "period": period,
+            "pairs": [
+                [pair[0], pair[1], count] for pair, count in history.counts.items()
+            ],
+        }
+        tmp = "{}.tmp".format(self.snapshot_path)
+        with open(tmp, "w") as fp:
+            json.dump(snapshot, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, self.snapshot_path)
+        # a crash here is harmless: the entries before `period` are ignored
+        open(self.path, "w").close()
+        self.snapshot = snapshot
+        self.entries = []
+
+    def load(self, period):
+        hadcoffee = set()
+        for entry_period, member, partner in self._read_entries():
+            if entry_period in (period, None):
+                hadcoffee.add(member)
+                if partner is not None:
+                    hadcoffee.add(partner)
+        return hadcoffee
+
+    def _cut_partial_line(self):
+        """ Remove the end of a line torn by a crash, the next record would be
+        appended to it
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as fp:
+            end = fp.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                fp.seek(start)
+                newline = fp.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position != end:
+                fp.truncate(position)
+
+    def record(self, couples, period, day):
+        entries = self._read_entries()
+        self._cut_partial_line()
+        with open(self.path, "a") as fp:
+            for couple in couples:
+                for member, partner in group_pairs(couple):
+                    fp.write(
+                        "{} {} {} {}\n".format(period, day.isoformat(), member, partner)
+                    )
+                    entries.append((period, member, partner))
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    def pair_history(self):
+        history = PairHistory(self._read_snapshot()["pairs"])
+        for _, member, partner in self._read_entries():
+            if partner is not None:
+                history.add(member, partner)
+        return history
+
+    def close(self):
+        pass
+
+
+class SqliteState:
+    """ State backend keeping the whole pairing history, indexed by period
+    and member
+    Aggregates per pair, member and period are updated with every record, the
+    reports read them instead of scanning the history.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS coffee (
+            period INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            member TEXT NOT NULL,
+            partner TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS coffee_period_member
+            ON coffee (period, member);
+        CREATE INDEX IF NOT EXISTS coffee_member_partner
+            ON coffee (member, partner);
+    """
+
+    # version 1: aggregates, the coffees of a member are the days they had
+    # one
+    AGGREGATES = (
+        """CREATE TABLE pair_stats (
+            member TEXT NOT NULL,
+            partner TEXT NOT NULL,
+            coffees INTEGER NOT NULL,
+            last_day TEXT NOT NULL,
+            PRIMARY KEY (member, partner)
+        )""",
+        """CREATE TABLE member_stats (
+            member TEXT PRIMARY KEY,
+            coffees INTEGER NOT NULL,
+            periods INTEGER NOT NULL,
+            last_period INTEGER NOT NULL,
+            first_day TEXT NOT NULL,
+            last_day TEXT NOT NULL
+        )""",
+        "CREATE INDEX member_stats_last_day ON member_stats (last_day)",
+        """CREATE TABLE period_stats (
+            period INTEGER PRIMARY KEY,
+            members INTEGER NOT NULL,
+            pairs INTEGER NOT NULL
+        )""",
+        """INSERT INTO pair_stats
+            SELECT member, partner, COUNT(*), MAX(day) FROM coffee
+            WHERE member < partner GROUP BY member, partner""",
+        """INSERT INTO member_stats
+            SELECT member, COUNT(DISTINCT day), COUNT(DISTINCT period),
+                MAX(period), MIN(day), MAX(day)
+            FROM coffee GROUP BY member""",
+        """INSERT INTO period_stats
+            SELECT period, COUNT(DISTINCT member), COUNT(*) / 2 FROM coffee
+            GROUP BY period""",
+        "PRAGMA user_version = 1",
+    )
+
+    def __init__(self, path):
+        import sqlite3
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.executescript(self.SCHEMA)
+            (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if version < 1:
+            # built from the history of a former database
+            self._migrate(self.AGGREGATES)
+
+    def _migrate(self, statements):
+        """ Run the statements in one transaction, executescript would commit
+        them one by one and a failure would leave a part of them
+        """
+        with self.connection:
+            self.connection.execute("BEGIN")
+            for statement in statements:
+                self.connection.execute(statement)
+
+    def reset(self, period):
+        # history is kept, a new period simply starts with no row
+        pass
+
+    def load(self, period):
+        rows = self.connection.execute(
+            "SELECT DISTINCT member FROM coffee WHERE period = ?", (period,)
+        )
+        return {row[0] for row in rows}
+
+    def record(self, couples, period, day):
+        day = day.isoformat()
+        rows = []
+        pairs = []
+        members = []
+        for couple in couples:
+            for member, partner in group_pairs(couple):
+                rows.append((period, day, member, partner))
+                rows.append((period, day, partner, member))
+                pairs.append((min(member, partner), max(member, partner), day))
+            members.extend(couple)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO coffee (period, day, member, partner) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._update_stats(pairs, members, period, day)
+
+    def _update_stats(self, pairs, members, period, day):
+        newcomers = 0
+        for member in set(members):
+            row = self.connection.execute(
+                "SELECT last_period FROM member_stats WHERE member = ?", (member,)
+            ).fetchone()
+            if row is None or row[0] != period:
+                newcomers += 1
+        # no upsert (INSERT ... ON CONFLICT), it needs SQLite >= 3.24
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO member_stats VALUES (?, 0, 0, -1, ?, '')",
+            [(member, day) for member in members],
+        )
+        self.connection.executemany(
+            "UPDATE member_stats SET coffees = coffees + (last_day != ?), "
+            "periods = periods + (last_period != ?), last_period = ?, last_day = ? "
+            "WHERE member = ?",
+            [(day, period, period, day, member) for member in members],
+        )
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO pair_stats VALUES (?, ?, 0, ?)", pairs
+        )
+        self.connection.executemany(
+            "UPDATE pair_stats SET coffees = coffees + 1, last_day = ? "
+            "WHERE member = ? AND partner = ?",
+            [(day, member, partner) for member, partner, day in pairs],
+        )
+        self.connection.execute(
+            "INSERT OR IGNORE INTO period_stats VALUES (?, 0, 0)", (period,)
+        )
+        self.connection.execute(
+            "UPDATE period_stats SET members = members + ?, pairs = pairs + ? "
+            "WHERE period = ?",
+            (newcomers, len(pairs), period),
+        )
+
+    def pair_counts(self):
+        """ Return (member, partner, count) for every pair which had a coffee
+        """
+        return self.connection.execute(
+            "SELECT member, partner, coffees FROM pair_stats"
+        )
+
+    def coverage(self):
+        """ Return (period, members, pairs) for every period
+        """
+        return self.connection.execute(
+            "SELECT period, members, pairs FROM period_stats ORDER BY period"
+        ).fetchall()
+
+    def repeat_frequency(self):
+        """ Return (coffees, pairs): how many pairs had that many coffees
+        together
+        """
+        return self.connection.execute(
+            "SELECT coffees, COUNT(*) FROM pair_stats GROUP BY coffees "
+            "ORDER BY coffees"
+        ).fetchall()
+
+    def participation(self, before=None):
+        """ Return (member, coffees, periods, first day, last day) for every
+        member, the least recent first, only those whose last coffee was
+        before `before` (a date) when it is given
+        """
+        query = "SELECT member, coffees, periods, first_day, last_day FROM member_stats"
+        params = ()
+        if before is not None:
+            query += " WHERE last_day < ?"
+            params = (before.isoformat(),)
+        return self.connection.execute(
+            query + " ORDER BY last_day, member", params
+        ).fetchall()
+
+    def met(self, member, partner):
+        """ Return how many coffees member and partner had together and the
+        day of the last one (None if they never met)
+        """
+        row = self.connection.execute(
+            "SELECT coffees, last_day FROM pair_stats "
+            "WHERE member = ? AND partner = ?",
+            (min(member, partner), max(member, partner)),
+        ).fetchone()
+        return row if row is not None else (0, None)
+
+    def pair_history(self):
+        return PairHistory(self.pair_counts())
+
+    def partners(self, member):
+        rows = self.connection.execute(
+            "SELECT partner FROM coffee WHERE member = ?", (member,)
+        )
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.connection.close()
+
+
+def open_state(config):
+    if config.state_backend == "sqlite":
+        return SqliteState(config.state_db)
+    elif config.state_backend == "journal":
+        return JournalState(config.hadcoffee_file)
+    elif config.state_backend == "text":
+        return TextFileState(config.hadcoffee_file)
+    raise Exception("Unknown state backend: {}".format(config.state_backend))
@@ -1,4 +1,5 @@
 from configparser import ConfigParser
+import os
 import tempfile
 from unittest.mock import patch
 
@@ -7,8 +8,9 @@ def mock_config(func):
     def wrapper(*args, **kwargs):
         with tempfile.NamedTemporaryFile() as config_file:
             print("Mock config file {}".format(config_file.name))
-            with tempfile.NamedTemporaryFile() as hadcoffee_file:
-                print("Mock hadcoffee file {}".format(hadcoffee_file.name))
+            with tempfile.TemporaryDirectory() as state_dir:
+                hadcoffee_file = os.path.join(state_dir, "hadcoffee.txt")
+                print("Mock hadcoffee file {}".format(hadcoffee_file))
                 with patch(
                     "coffeeconnection.config._get_config_path",
                     return_value=config_file.name,
@@ -17,12 +19,13 @@ def mock_config(func):
                     configparser["DEFAULT"] = {
                         "epoch": "2018-06-11",
                         "week_period": 1,
-                        "hadcoffee": hadcoffee_file.name,
+                        "hadcoffee": hadcoffee_file,
                         "channel": "slack_channel_id",
                         "token": "slack_token",
                         "hook": "url",
                         "days_off": "",
                         "skip_emoji_list": "",
+                        "announce": "pair",
                     }
                     with open(config_file.name, "w") as config_file_fd:
                         configparser.write(config_file_fd)
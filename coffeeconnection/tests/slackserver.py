@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_user(index):
+    """ A Slack user, every 20th is deleted, every 50th is a bot and every
+    30th is on vacation
+    """
+    return {
+        "id": "U{:06d}".format(index),
+        "name": "user{}".format(index),
+        "deleted": index % 20 == 19,
+        "is_bot": index % 50 == 49,
+        "profile": {
+            "real_name": "User {}".format(index),
+            "status_emoji": ":palm_tree:" if index % 30 == 29 else "",
+            "image_512": "https://example.com/{}.png".format(index),
+        },
+    }
+
+
+def fake_dnd(index):
+    """ Do not disturb status of a user, every 11th is in do not disturb
+    """
+    now = time.time()
+    start = now - 60 if index % 11 == 10 else now + 3600
+    return {
+        "dnd_enabled": True,
+        "next_dnd_start_ts": start,
+        "next_dnd_end_ts": start + 7200,
+    }
+
+
+class SlackHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body, content_type="application/json"):
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self.server.count()
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/api/users.list":
+            self._reply(json.dumps(self.server.users_page(params)))
+        elif url.path == "/api/conversations.members":
+            self._reply(json.dumps(self.server.members_page(params)))
+        elif url.path == "/api/users.info":
+            index = int(params["user"][1:])
+            if index < self.server.size:
+                self._reply(json.dumps({"ok": True, "user": fake_user(index)}))
+            else:
+                self._reply(json.dumps({"ok": False, "error": "user_not_found"}))
+        elif url.path == "/api/users.getPresence":
+            index = int(params["user"][1:])
+            presence = "away" if index % 7 == 6 else "active"
+            self._reply(json.dumps({"ok": True, "presence": presence}))
+        elif url.path == "/api/dnd.teamInfo":
+            users = {
+                user: fake_dnd(int(user[1:])) for user in params["users"].split(",")
+            }
+            self._reply(json.dumps({"ok": True, "users": users}))
+        else:
+            self._reply(json.dumps({"ok": False, "error": "unknown_method"}))
+
+    def do_POST(self):
+        self.server.count()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply("ok", content_type="text/plain")
+
+
+class SlackServer(ThreadingHTTPServer):
+    """ Local stand-in for the Slack Web API and the incoming webhook
+    It serves `size` users, the first `channel_size` ones (all by default)
+    are members of the channel, and answers every request after `latency`
+    seconds.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, size, latency=0, page_limit=1000, channel_size=None):
+        super().__init__(("127.0.0.1", 0), SlackHandler)
+        self.size = size
+        self.latency = latency
+        self.page_limit = page_limit
+        self.members = [
+            "U{:06d}".format(index) for index in range(channel_size or size)
+        ]
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _page(self, params, size, item):
+        limit = min(int(params.get("limit", self.page_limit)), self.page_limit)
+        start = int(params.get("cursor") or 0)
+        end = min(start + limit, size)
+        return {
+            "ok": True,
+            "members": [item(index) for index in range(start, end)],
+            "response_metadata": {"next_cursor": str(end) if end < size else ""},
+        }
+
+    def users_page(self, params):
+        return self._page(params, self.size, fake_user)
+
+    def members_page(self, params):
+        return self._page(params, len(self.members), self.members.__getitem__)
+
+    def __enter__(self):
+        self.thread = threading.Thread(
+            target=self.serve_forever, args=(0.01,), daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,132 @@
+import asyncio
+import datetime
+import sys
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from coffeeconnection import coffeeconnection
+from coffeeconnection.config import Configuration
+from coffeeconnection.state import JournalState
+from coffeeconnection.tests.mocking import mock_config
+from coffeeconnection.tests.slackserver import SlackServer
+
+pytest.importorskip("aiohttp")
+
+from coffeeconnection import asyncslack  # noqa: E402
+from coffeeconnection.asyncslack import (  # noqa: E402
+    AsyncSlack,
+    async_coffeeconnection,
+)
+
+
+async def get_members(config, workspace=None):
+    async with AsyncSlack(config, workspace) as slack:
+        return await slack.get_slack_members(), slack.workspace
+
+
+@mock_config
+def test_get_slack_members():
+    config = Configuration()
+    config.load()
+    config.rate_limits = False
+    config.skip_emoji_list = [":palm_tree:"]
+    with SlackServer(450, page_limit=100) as server:
+        config.api_url = "{}/api".format(server.url)
+        expected = coffeeconnection.Slack(config).get_slack_members()
+        requests = server.requests
+        members, _ = asyncio.run(get_members(config))
+        assert server.requests == 2 * requests
+    assert members == expected
+
+
+@mock_config
+def test_get_slack_members_channel_first():
+    config = Configuration()
+    config.load()
+    config.rate_limits = False
+    config.skip_emoji_list = [":palm_tree:"]
+    with SlackServer(5000, page_limit=200, channel_size=50) as server:
+        config.api_url = "{}/api".format(server.url)
+        members, workspace = asyncio.run(get_members(config))
+        assert server.requests == 1 + 25
+        assert workspace.size == 5000
+
+        assert asyncio.run(get_members(config, workspace))[0] == members
+        assert server.requests == 1 + 25 + 1 + 50
+    assert len(members) == 46
+
+
+@mock_config
+def test_cache_shared_with_sync_client():
+    config = Configuration()
+    config.load()
+    config.rate_limits = False
+    config.cache_ttl = 600
+    with SlackServer(
+        450, page_limit=100
+    ) as server, tempfile.TemporaryDirectory() as directory:
+        config.api_url = "{}/api".format(server.url)
+        config.cache_dir = directory
+        expected = coffeeconnection.Slack(config).get_slack_members()
+        requests = server.requests
+        members, _ = asyncio.run(get_members(config))
+        assert server.requests == requests
+    assert members == expected
+
+
+def test_main_without_aiohttp():
+    with patch.dict(sys.modules, {"aiohttp": None}), patch(
+        "coffeeconnection.asyncslack.Configuration"
+    ) as configuration:
+        assert asyncslack.main() == 1
+    # stopped before loading the configuration
+    configuration.assert_not_called()
+
+
+async def get_user(config, user_id):
+    async with AsyncSlack(config) as slack:
+        return await slack.get_slack_user(user_id, asyncio.Semaphore(1))
+
+
+@mock_config
+def test_get_slack_user():
+    config = Configuration()
+    config.load()
+    config.rate_limits = False
+    with SlackServer(10) as server:
+        config.api_url = "{}/api".format(server.url)
+        assert not asyncio.run(get_user(config, "U000001"))["deleted"]
+        assert asyncio.run(get_user(config, "U000042"))["deleted"]
+        url = server.url
+    # a network failure is not a deleted user
+    config.api_url = "{}/api".format(url)
+    with pytest.raises(Exception):
+        asyncio.run(get_user(config, "U000001"))
+
+
+@mock_config
+def test_async_coffeeconnection():
+    config = Configuration()
+    config.load()
+    config.rate_limits = False
+    config.today = datetime.date(2018, 6, 11)
+
+    async def run():
+        async with AsyncSlack(config) as slack:
+            await async_coffeeconnection(slack, config, ["{} {}"])
+
+    with SlackServer(40) as server:
+        config.api_url = "{}/api".format(server.url)
+        config.hook = "{}/hook".format(server.url)
+        asyncio.run(run())
+        # 1 conversations.members, 1 users.list, 4 announces for 40 members
+        assert server.requests == 1 + 1 + 4
+
+        config.today = datetime.date(2018, 6, 12)
+        config.announce = "batch"
+        asyncio.run(run())
+        # the 4 couples of the day in one message
+        assert server.requests == 1 + 1 + 4 + 1 + 1 + 1
+    assert len(JournalState(config.hadcoffee_file).load(0)) == 16
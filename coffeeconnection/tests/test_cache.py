@@ -0,0 +1,90 @@
+import os
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+from coffeeconnection.cache import ResponseCache
+
+
+def test_cache_hit():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(directory, 60, 1024)
+        assert cache.get("users.list", {"limit": 200}) is None
+        cache.set("users.list", {"limit": 200}, {"ok": True, "members": []})
+        assert cache.get("users.list", {"limit": 200}) == {"ok": True, "members": []}
+        assert cache.get("users.list", {"limit": 100}) is None
+        assert cache.get("channels.info", {"limit": 200}) is None
+
+
+def test_cache_expired():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(directory, 60, 1024)
+        cache.set("users.list", None, {"ok": True})
+        path = cache._path("users.list", None)
+        old = time.time() - 120
+        os.utime(path, (old, old))
+        assert cache.get("users.list") is None
+
+
+def test_cache_refresh():
+    with tempfile.TemporaryDirectory() as directory:
+        ResponseCache(directory, 60, 1024).set("users.list", None, {"ok": True})
+        cache = ResponseCache(directory, 60, 1024, refresh=True)
+        assert cache.get("users.list") is None
+
+
+def test_cache_eviction():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(directory, 60, 100)
+        cache.set("first", None, {"data": "x" * 40})
+        old = time.time() - 10
+        os.utime(cache._path("first", None), (old, old))
+        cache.set("second", None, {"data": "y" * 40})
+        cache.set("third", None, {"data": "z" * 40})
+        assert cache.get("first") is None
+        assert cache.get("third") == {"data": "z" * 40}
+
+
+def test_cache_eviction_counted():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(directory, 60, 1000)
+        with patch("os.scandir", wraps=os.scandir) as scandir:
+            for index in range(10):
+                cache.set("endpoint", {"index": index}, {"data": "x" * 50})
+            # listed by the first write only
+            assert scandir.call_count == 1
+            for index in range(10, 40):
+                cache.set("endpoint", {"index": index}, {"data": "x" * 50})
+            assert scandir.call_count > 1
+        assert cache.size <= 1000
+        assert len(os.listdir(directory)) < 40
+
+
+def test_cache_workspaces():
+    config = MagicMock(
+        cache_ttl=60,
+        cache_max_size=1024,
+        cache_refresh=False,
+        token="xoxp-1",
+        api_url="https://slack.com/api",
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        config.cache_dir = directory
+        ResponseCache.from_config(config).set("users.list", None, {"ok": True})
+        assert ResponseCache.from_config(config).get("users.list") == {"ok": True}
+        config.token = "xoxp-2"
+        assert ResponseCache.from_config(config).get("users.list") is None
+        with open(os.path.join(directory, os.listdir(directory)[0])) as fp:
+            assert "xoxp" not in fp.read()
+
+
+def test_cache_eviction_race():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(directory, 60, 1)
+        cache.set("users.list", None, {"ok": True})
+        path = cache._path("users.info", None)
+        with open(path, "w") as fp:
+            fp.write("{}")
+        # another thread evicts the entry between the scan and the removal
+        with patch("os.remove", side_effect=FileNotFoundError):
+            cache.evict()
@@ -1,4 +1,7 @@
 import datetime
+import json
+import os
+import tempfile
 from unittest.mock import MagicMock, patch
 
 import responses
@@ -7,7 +10,9 @@ import pytest
 
 from coffeeconnection import coffeeconnection
 from coffeeconnection.config import Configuration
+from coffeeconnection.state import JournalState
 from coffeeconnection.tests.mocking import mock_config
+from coffeeconnection.tests.slackserver import SlackServer
 
 
 def date_from_str(datestr):
@@ -100,7 +105,7 @@ def test_create_matches():
 
 
 @mock_config
-@patch("coffeeconnection.coffeeconnection.get_already_had_coffee_members")
+@patch("coffeeconnection.state.get_already_had_coffee_members")
 def test_main_1(get_already_had_coffee_members):
     members = ["a", "b", "c"]
     config = Configuration()
@@ -111,6 +116,7 @@ def test_main_1(get_already_had_coffee_members):
     slack.match = MagicMock()
     get_already_had_coffee_members.return_value = ["a", "b"]
 
+    config.state_backend = "text"
     config.today = date_from_str("2018-06-18")
     coffeeconnection.coffeeconnection(slack, config, [""])
     assert slack.match.call_count == 1
@@ -239,7 +245,7 @@ def test_main_32():
     config = Configuration()
     config.load()
 
-    slack = coffeeconnection.Slack(Configuration())
+    slack = coffeeconnection.Slack(config)
     slack.get_slack_members = MagicMock(return_value=members)
     slack.match = MagicMock()
 
@@ -350,3 +356,458 @@ def test_response_bad_json():
     resp = requests.post("http://url")
     with pytest.raises(Exception):
         coffeeconnection.check_response(resp)
+
+
+def slack_user(user_id, deleted=False, is_bot=False, status_emoji=""):
+    return {
+        "id": user_id,
+        "deleted": deleted,
+        "is_bot": is_bot,
+        "profile": {"status_emoji": status_emoji, "image_512": "http://img"},
+    }
+
+
+@mock_config
+@responses.activate
+def test_get_slack_members_paginated():
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/users.list",
+        json={
+            "ok": True,
+            "members": [slack_user("a"), slack_user("b", deleted=True)],
+            "response_metadata": {"next_cursor": "page2"},
+        },
+    )
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/users.list",
+        json={
+            "ok": True,
+            "members": [
+                slack_user("c", is_bot=True),
+                slack_user("d", status_emoji=":palm_tree:"),
+            ],
+            "response_metadata": {"next_cursor": ""},
+        },
+    )
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/conversations.members",
+        json={"ok": True, "members": ["a", "b", "c", "d", "e"]},
+    )
+    config = Configuration()
+    config.load()
+    config.skip_emoji_list = [":palm_tree:"]
+    slack = coffeeconnection.Slack(config)
+
+    assert slack.get_slack_members() == ["a", "e"]
+    assert "channel=slack_channel_id" in responses.calls[0].request.url
+    assert "cursor" not in responses.calls[1].request.url
+    assert "cursor=page2" in responses.calls[2].request.url
+    assert "limit=200" in responses.calls[2].request.url
+
+
+@mock_config
+@responses.activate
+def test_get_slack_members_cached():
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/users.list",
+        json={"ok": True, "members": [slack_user("a"), slack_user("b")]},
+    )
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/conversations.members",
+        json={"ok": True, "members": ["a", "b"]},
+    )
+    config = Configuration()
+    config.load()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        config.cache_dir = cache_dir
+        config.cache_ttl = 3600
+        assert coffeeconnection.Slack(config).get_slack_members() == ["a", "b"]
+        assert coffeeconnection.Slack(config).get_slack_members() == ["a", "b"]
+        assert len(responses.calls) == 2
+
+        config.cache_refresh = True
+        assert coffeeconnection.Slack(config).get_slack_members() == ["a", "b"]
+        assert len(responses.calls) == 4
+
+
+@mock_config
+@responses.activate
+def test_get_slack_user_errors():
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/users.info",
+        json={"ok": False, "error": "user_not_found"},
+    )
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/users.info",
+        json={"ok": False, "error": "internal_error"},
+    )
+    config = Configuration()
+    config.load()
+    slack = coffeeconnection.Slack(config)
+    assert slack.get_slack_user("U1")["deleted"]
+    # only an unknown user is taken as deleted
+    with pytest.raises(coffeeconnection.ApiError, match="internal_error"):
+        slack.get_slack_user("U2")
+
+
+def test_project_roster():
+    user = {
+        "id": "a",
+        "name": "alice",
+        "deleted": False,
+        "profile": {
+            "status_emoji": ":palm_tree:",
+            "image_512": "https://example.com/a.png",
+            "fields": {"Xf01": {"value": "x", "alt": ""}},
+        },
+    }
+    body = {
+        "ok": True,
+        "members": [user],
+        "cache_ts": 1,
+        "response_metadata": {"next_cursor": "", "messages": []},
+    }
+    response = MagicMock(
+        status_code=200,
+        headers={"content-type": "application/json"},
+        content=json.dumps(body).encode(),
+    )
+    data = coffeeconnection.check_response(response, coffeeconnection.project_roster)
+    assert data == {
+        "ok": True,
+        "members": [
+            {"id": "a", "deleted": False, "profile": {"status_emoji": ":palm_tree:"}}
+        ],
+        "response_metadata": {"next_cursor": ""},
+    }
+
+
+@mock_config
+def test_main_sqlite():
+    members = [str(i) for i in range(1, 24)]
+    config = Configuration()
+    config.load()
+
+    slack = coffeeconnection.Slack(config)
+    slack.get_slack_members = MagicMock(return_value=members)
+    slack.match = MagicMock()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config.state_backend = "sqlite"
+        config.state_db = os.path.join(directory, "state.db")
+        for day in range(18, 23):
+            config.today = date_from_str("2018-06-{}".format(day))
+            coffeeconnection.coffeeconnection(slack, config, [""])
+        assert slack.match.call_count == 12
+
+        # a new period starts with an empty queue but the history is kept
+        config.today = date_from_str("2018-06-25")
+        coffeeconnection.coffeeconnection(slack, config, [""])
+        assert slack.match.call_count == 15
+
+
+@mock_config
+@responses.activate
+def test_announce():
+    responses.add(responses.POST, "http://hook", body="ok", content_type="text/plain")
+    responses.add(responses.POST, "http://hook", status=400, body="error")
+    config = Configuration()
+    config.load()
+    config.hook = "http://hook"
+    config.post_workers = 1
+    slack = coffeeconnection.Slack(config)
+
+    announced, failures = slack.announce([("a", "b"), ("c", "d")], ["{} {}"])
+    assert announced == [("a", "b")]
+    assert len(failures) == 1
+    assert failures[0][0] == ("c", "d")
+
+
+@mock_config
+@responses.activate
+def test_announce_batch():
+    responses.add(responses.POST, "http://hook", body="ok", content_type="text/plain")
+    responses.add(responses.POST, "http://hook", status=400, body="error")
+    config = Configuration()
+    config.load()
+    config.hook = "http://hook"
+    config.announce = "batch"
+    slack = coffeeconnection.Slack(config)
+
+    couples = [(str(i), str(i + 1)) for i in range(0, 120, 2)]
+    recorded = []
+    announced, failures = slack.announce(couples, ["{} {}"], recorded.append)
+    assert len(responses.calls) == 2
+    assert announced == couples[:50]
+    assert recorded == couples[:50]
+    assert [couple for couple, _ in failures] == couples[50:]
+
+    payload = json.loads(responses.calls[0].request.body)
+    assert len(payload["blocks"]) == 50
+    assert payload["text"].splitlines()[0] == "<@0> <@1>"
+
+
+def test_batches_text_length():
+    slack = coffeeconnection.Slack(MagicMock(cache_ttl=0))
+    couples = [(str(i), str(i + 1)) for i in range(0, 80, 2)]
+    batches = list(slack.batches(couples, ["{} {}" + "." * 200]))
+    assert len(batches) == 3
+    assert sum(len(batch) for batch, _, _ in batches) == 40
+    for _, text, blocks in batches:
+        assert len(text) <= coffeeconnection.MAX_TEXT_LENGTH
+        assert len(blocks) <= coffeeconnection.MAX_BLOCKS
+
+
+def test_batches_long_line():
+    slack = coffeeconnection.Slack(MagicMock(cache_ttl=0))
+    couples = [("a", "b"), ("c", "d")]
+    batches = list(slack.batches(couples, ["{} {}" + "." * 5000]))
+    assert [batch for batch, _, _ in batches] == [[("a", "b")], [("c", "d")]]
+    for _, text, blocks in batches:
+        assert len(text) == coffeeconnection.MAX_TEXT_LENGTH
+        assert len(blocks[0]["text"]["text"]) == coffeeconnection.MAX_SECTION_LENGTH
+
+
+@mock_config
+def test_main_batch():
+    members = [str(i) for i in range(1, 24)]
+    config = Configuration()
+    config.load()
+    config.announce = "batch"
+
+    slack = coffeeconnection.Slack(config)
+    slack.get_slack_members = MagicMock(return_value=members)
+    slack.say = MagicMock()
+
+    for day in range(18, 23):
+        config.today = date_from_str("2018-06-{}".format(day))
+        coffeeconnection.coffeeconnection(slack, config, ["{} {}"])
+    # one message a day, the leftover of the last day included
+    assert slack.say.call_count == 5
+    # 11 couples and the leftover
+    assert sum(len(call[0][1]) for call in slack.say.call_args_list) == 12
+    assert len(JournalState(config.hadcoffee_file).load(1)) == 23
+
+
+@mock_config
+def test_main_schedule():
+    members = [str(i) for i in range(1, 24)]
+    config = Configuration()
+    config.load()
+
+    slack = coffeeconnection.Slack(config)
+    slack.get_slack_members = MagicMock(return_value=members)
+    slack.match = MagicMock()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config.schedule_file = os.path.join(directory, "schedule.json")
+        config.today = date_from_str("2018-06-18")
+        coffeeconnection.coffeeconnection(slack, config, [""])
+        assert slack.match.call_count == 2
+        with open(config.schedule_file) as fp:
+            days = json.load(fp)["days"]
+        assert len(days) == 4
+
+        # 24 joins, a member planned on friday leaves
+        leaver = days["2018-06-22"][0][0]
+        slack.get_slack_members.return_value = [
+            member for member in members if member != leaver
+        ] + ["24"]
+        for day in range(19, 23):
+            config.today = date_from_str("2018-06-{}".format(day))
+            coffeeconnection.coffeeconnection(slack, config, [""])
+
+    couples = [call[0][0] for call in slack.match.call_args_list]
+    # 11 couples, the partner of the leaver is alone on friday
+    assert len(couples) == 12
+    hadcoffee = JournalState(config.hadcoffee_file).load(1)
+    assert hadcoffee == set(members) - {leaver} | {"24"}
+
+
+def test_render_group():
+    render = coffeeconnection.Slack.render
+    assert render(("a", "b"), ["{} and {}"]) == "<@a> and <@b>"
+    assert render(("a", "b", "c"), ["{} and {}"]) == "<@a>, <@b> and <@c>"
+
+
+@mock_config
+def test_main_groups():
+    members = [str(i) for i in range(1, 24)]
+    config = Configuration()
+    config.load()
+    config.group_size = 3
+
+    slack = coffeeconnection.Slack(config)
+    slack.get_slack_members = MagicMock(return_value=members)
+    slack.match = MagicMock()
+
+    for day in range(18, 23):
+        config.today = date_from_str("2018-06-{}".format(day))
+        coffeeconnection.coffeeconnection(slack, config, [""])
+
+    groups = [call[0][0] for call in slack.match.call_args_list]
+    assert sum(len(group) for group in groups) == 23
+    assert all(2 <= len(group) <= 3 for group in groups)
+    assert JournalState(config.hadcoffee_file).load(1) == set(members)
+
+
+@mock_config
+def test_main_announce_failure():
+    members = ["a", "b", "c", "d"]
+    config = Configuration()
+    config.load()
+
+    slack = coffeeconnection.Slack(config)
+    slack.get_slack_members = MagicMock(return_value=members)
+    slack.match = MagicMock(side_effect=[None, Exception("boom")])
+    config.post_workers = 1
+
+    config.today = date_from_str("2018-06-22")
+    with pytest.raises(Exception, match="1 matches not announced: boom"):
+        coffeeconnection.coffeeconnection(slack, config, [""])
+    assert slack.match.call_count == 2
+    # the announced couple is recorded all the same
+    assert len(JournalState(config.hadcoffee_file).load(1)) == 2
+
+
+@responses.activate
+def test_response_429():
+    responses.add(responses.POST, "http://url", status=429, body="slow down")
+    resp = requests.post("http://url")
+    with pytest.raises(Exception) as error:
+        coffeeconnection.check_response(resp)
+    assert error.value.args[0] == "Rate limited: slow down"
+
+
+@mock_config
+@responses.activate
+def test_get_slack_members_rate_limited():
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/users.list",
+        status=429,
+        headers={"Retry-After": "0"},
+    )
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/users.list",
+        json={"ok": True, "members": [slack_user("a")]},
+    )
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/conversations.members",
+        json={"ok": True, "members": ["a"]},
+    )
+    config = Configuration()
+    config.load()
+    slack = coffeeconnection.Slack(config)
+    slack.scheduler.sleep = MagicMock()
+    assert slack.get_slack_members() == ["a"]
+    assert len(responses.calls) == 3
+    assert slack.scheduler.sleep.called
+
+
+def test_dayleft_days_off():
+    epoch = date_from_str("2018-12-24")
+    monday = date_from_str("2018-12-24")
+    wednesday = date_from_str("2018-12-26")
+    days_off = ["2018-12-25", "2019-01-01"]
+
+    assert coffeeconnection.dayleft(monday, epoch, 1, days_off) == 4
+    assert coffeeconnection.dayleft(wednesday, epoch, 1, days_off) == 3
+    assert coffeeconnection.dayleft(monday, epoch, 2, days_off) == 8
+
+
+@mock_config
+def test_get_slack_members_server():
+    config = Configuration()
+    config.load()
+    with SlackServer(450, page_limit=100) as server:
+        config.api_url = "{}/api".format(server.url)
+        config.skip_emoji_list = [":palm_tree:"]
+        members = coffeeconnection.Slack(config).get_slack_members()
+        assert server.requests == 10
+    assert len(members) == 417
+    assert "U000019" not in members
+
+
+@mock_config
+def test_get_slack_members_channel_first():
+    config = Configuration()
+    config.load()
+    config.skip_emoji_list = [":palm_tree:"]
+    config.rate_limits = False
+    with SlackServer(5000, page_limit=200, channel_size=50) as server:
+        config.api_url = "{}/api".format(server.url)
+        slack = coffeeconnection.Slack(config)
+
+        # the workspace size is unknown, download all the users
+        members = slack.get_slack_members()
+        assert server.requests == 1 + 25
+        assert slack.workspace.size == 5000
+
+        # now it is known, the channel is small: fetch its users one by one
+        assert slack.get_slack_members() == members
+        assert server.requests == 1 + 25 + 1 + 50
+    assert len(members) == 46
+
+
+@mock_config
+def test_get_slack_members_presence():
+    config = Configuration()
+    config.load()
+    config.rate_limits = False
+    config.skip_away = True
+    config.skip_dnd = True
+    with SlackServer(200, channel_size=120) as server:
+        config.api_url = "{}/api".format(server.url)
+        slack = coffeeconnection.Slack(config)
+        members = slack.get_slack_members()
+        # 2 rosters, 3 dnd.teamInfo calls for 113 available users, and the
+        # presence of the 103 not in dnd
+        assert server.requests == 2 + 3 + 103
+        for member in members:
+            index = int(member[1:])
+            assert index % 7 != 6 and index % 11 != 10
+
+        # the statuses are kept by the workspace
+        assert slack.get_slack_members() == members
+        assert server.requests == 2 + 3 + 103 + 2
+    assert len(members) == 87
+
+
+def test_workspace_statuses():
+    workspace = coffeeconnection.Workspace(MagicMock(rate_limits=False))
+    fetch = MagicMock(side_effect=lambda ids: {user_id: True for user_id in ids})
+    assert workspace.statuses_of("away", ["a", "b"], fetch, 60) == {
+        "a": True,
+        "b": True,
+    }
+    assert workspace.statuses_of("away", ["b", "c"], fetch, 60) == {
+        "b": True,
+        "c": True,
+    }
+    assert fetch.call_args_list[1][0][0] == ["c"]
+    workspace.statuses_of("away", ["a"], fetch, -1)
+    assert fetch.call_count == 3
+
+
+def test_channel_first():
+    config = MagicMock(roster_strategy="auto", workspace_size=40000, cache_ttl=0)
+    slack = coffeeconnection.Slack(config, MagicMock(size=None))
+    assert slack.channel_first(300)
+    assert not slack.channel_first(3000)
+
+    config.workspace_size = 0
+    assert not slack.channel_first(300)
+    config.roster_strategy = "channel"
+    assert slack.channel_first(3000)
+    config.roster_strategy = "workspace"
+    assert not slack.channel_first(10)
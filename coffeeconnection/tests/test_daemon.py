@@ -0,0 +1,110 @@
+import datetime
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from coffeeconnection import daemon
+from coffeeconnection.coffeeconnection import Workspace
+from coffeeconnection.config import load_channels
+from coffeeconnection.state import open_state
+
+CHANNELS = """
+[DEFAULT]
+epoch = 2018-06-11
+week_period = 1
+token = token1
+hook = url
+days_off =
+metrics_json = /var/lib/coffeeconnection/metrics.json
+
+[first]
+channel = c1
+hadcoffee = first.txt
+run_at = 09:30
+
+[second]
+channel = c2
+hadcoffee = second.txt
+
+[other]
+channel = c3
+hadcoffee = other.txt
+token = token2
+state_db = other.db
+"""
+
+
+def test_seconds_until():
+    now = datetime.datetime(2018, 6, 11, 15, 0)
+    assert daemon.seconds_until(datetime.time(16, 0), now) == 3600
+    assert daemon.seconds_until(datetime.time(15, 0), now) == 24 * 3600
+    assert daemon.seconds_until(datetime.time(14, 0), now) == 23 * 3600
+
+
+def test_load_channels():
+    with tempfile.NamedTemporaryFile("w") as config_file:
+        config_file.write(CHANNELS)
+        config_file.flush()
+        with patch(
+            "coffeeconnection.config._get_config_path", return_value=config_file.name
+        ):
+            configs = load_channels()
+
+    assert [config.channel for config in configs] == ["c1", "c2", "c3"]
+    assert configs[0].run_at == datetime.time(9, 30)
+    assert configs[1].run_at == datetime.time(16, 0)
+    assert configs[1].hadcoffee_file == "second.txt"
+    assert configs[2].token == "token2"
+
+    # channels do not share the paths of the DEFAULT section
+    assert configs[0].state_db == "coffeeconnection-first.db"
+    assert configs[1].metrics_json == "/var/lib/coffeeconnection/metrics-second.json"
+    assert configs[1].metrics_prom is None
+    assert configs[2].state_db == "other.db"
+
+    slacks = daemon.get_slacks(configs)
+    assert slacks[0].workspace is slacks[1].workspace
+    assert slacks[0].workspace is not slacks[2].workspace
+
+
+def test_channels_journal():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "coffeeconnection.ini")
+        with open(path, "w") as config_file:
+            config_file.write(
+                "[DEFAULT]\nepoch = 2018-06-11\nweek_period = 1\ntoken = t\n"
+                "hook = url\nhadcoffee = {}\n\n"
+                "[a]\nchannel = c1\n\n[b]\nchannel = c2\n".format(
+                    os.path.join(directory, "hadcoffee.txt")
+                )
+            )
+        with patch("coffeeconnection.config._get_config_path", return_value=path):
+            configs = load_channels()
+        assert [config.hadcoffee_file for config in configs] == [
+            os.path.join(directory, "hadcoffee-a.txt"),
+            os.path.join(directory, "hadcoffee-b.txt"),
+        ]
+
+        states = [open_state(config) for config in configs]
+        for state in states:
+            state.reset(0)
+        states[0].record([("x", "y")], 0, datetime.date(2018, 6, 11))
+        states[1].reset(0)
+        assert states[0].load(0) == {"x", "y"}
+        assert open_state(configs[0]).load(0) == {"x", "y"}
+        assert open_state(configs[1]).load(0) == set()
+
+
+def test_workspace_roster():
+    config = MagicMock(post_workers=1)
+    fetch = MagicMock(return_value=iter([{"id": "a"}]))
+
+    workspace = Workspace(config, roster_ttl=600)
+    assert workspace.users(fetch) == [{"id": "a"}]
+    assert workspace.users(fetch) == [{"id": "a"}]
+    assert fetch.call_count == 1
+
+    workspace = Workspace(config)
+    workspace.users(fetch)
+    workspace.users(fetch)
+    assert fetch.call_count == 3
@@ -0,0 +1,178 @@
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+import requests
+import responses
+
+from coffeeconnection import coffeeconnection
+from coffeeconnection.config import Configuration
+from coffeeconnection import events
+from coffeeconnection.events import EventServer, RosterStore, verify_signature
+from coffeeconnection.tests.mocking import mock_config
+
+SECRET = "8f742231b10e8888abcd99yyyzzz85a5"
+
+# payloads as sent by the Slack Events API
+EVENTS = [
+    {"type": "url_verification", "token": "x", "challenge": "3eZbrw1aBm2rZgRNFdxV"},
+    {
+        "type": "event_callback",
+        "team_id": "T1",
+        "event": {
+            "type": "member_joined_channel",
+            "user": "U3",
+            "channel": "slack_channel_id",
+            "channel_type": "C",
+            "team": "T1",
+        },
+    },
+    {
+        "type": "event_callback",
+        "team_id": "T1",
+        "event": {
+            "type": "member_left_channel",
+            "user": "U2",
+            "channel": "slack_channel_id",
+            "channel_type": "C",
+            "team": "T1",
+        },
+    },
+    {
+        "type": "event_callback",
+        "team_id": "T1",
+        "event": {
+            "type": "user_change",
+            "user": {
+                "id": "U1",
+                "name": "alice",
+                "deleted": False,
+                "is_bot": False,
+                "profile": {"status_emoji": ":palm_tree:", "status_text": "away"},
+            },
+        },
+    },
+]
+
+
+def sign(body, timestamp):
+    basestring = "v0:{}:".format(timestamp).encode("utf-8") + body
+    digest = hmac.new(SECRET.encode("utf-8"), basestring, hashlib.sha256)
+    return "v0=" + digest.hexdigest()
+
+
+def post(url, payload, secret_ok=True):
+    body = json.dumps(payload).encode("utf-8")
+    timestamp = str(int(time.time()))
+    return requests.post(
+        url,
+        data=body,
+        headers={
+            "X-Slack-Request-Timestamp": timestamp,
+            "X-Slack-Signature": sign(body, timestamp) if secret_ok else "v0=bad",
+        },
+    )
+
+
+def test_verify_signature():
+    body = b'{"type": "event_callback"}'
+    assert verify_signature(SECRET, "1000", body, sign(body, "1000"), now=1100)
+    assert not verify_signature(SECRET, "1000", body, sign(body, "1000"), now=2000)
+    assert not verify_signature(SECRET, "1000", body, "v0=bad", now=1100)
+    assert not verify_signature(SECRET, None, body, sign(body, "1000"), now=1100)
+
+
+@mock_config
+@responses.activate
+def test_replay_events():
+    responses.add_passthru("http://127.0.0.1")
+    config = Configuration()
+    config.load()
+    config.skip_emoji_list = [":palm_tree:"]
+    config.roster_strategy = "events"
+
+    with tempfile.TemporaryDirectory() as directory:
+        config.roster_db = os.path.join(directory, "roster.db")
+        store = RosterStore(config.roster_db)
+        store.reconcile(
+            config.channel,
+            ["U1", "U2"],
+            [
+                {"id": "U1", "deleted": False, "is_bot": False, "status_emoji": ""},
+                {"id": "U2", "deleted": False, "is_bot": False, "status_emoji": ""},
+            ],
+        )
+
+        server = EventServer(("127.0.0.1", 0), store, SECRET)
+        thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+        thread.start()
+        url = "http://127.0.0.1:{}/".format(server.server_address[1])
+        try:
+            assert post(url, EVENTS[1], secret_ok=False).status_code == 401
+            reply = post(url, EVENTS[0])
+            assert reply.text == EVENTS[0]["challenge"]
+            for payload in EVENTS[1:]:
+                assert post(url, payload).status_code == 200
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            store.close()
+
+        # no API call: the roster comes from the store
+        slack = coffeeconnection.Slack(config)
+        assert slack.get_slack_members() == ["U3"]
+        assert slack.metrics.counters.get("api_calls", 0) == 0
+
+
+@mock_config
+@responses.activate
+def test_reconcile():
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/conversations.members",
+        json={"ok": True, "members": ["U1", "U2"]},
+    )
+    responses.add(
+        responses.GET,
+        "https://slack.com/api/users.list",
+        json={
+            "ok": True,
+            "members": [
+                {"id": "U1", "deleted": False, "is_bot": False, "profile": {}},
+                {"id": "U2", "deleted": True, "is_bot": False, "profile": {}},
+                {"id": "U9", "deleted": False, "is_bot": False, "profile": {}},
+            ],
+        },
+    )
+    config = Configuration()
+    config.load()
+    config.roster_strategy = "events"
+
+    with tempfile.TemporaryDirectory() as directory:
+        config.roster_db = os.path.join(directory, "roster.db")
+        assert coffeeconnection.Slack(config).get_slack_members() == ["U1"]
+        assert len(responses.calls) == 2
+
+        assert coffeeconnection.Slack(config).get_slack_members() == ["U1"]
+        assert len(responses.calls) == 2
+
+        store = RosterStore(config.roster_db)
+        assert store.channel_members(config.channel) == ["U1", "U2"]
+        assert [user["id"] for user in store.channel_users(config.channel)] == [
+            "U1",
+            "U2",
+        ]
+        store.close()
+
+
+@mock_config
+def test_main_without_secret():
+    with patch("coffeeconnection.events.EventServer") as server:
+        assert events.main() == 1
+        server.assert_not_called()
@@ -0,0 +1,41 @@
+import atexit
+import logging
+import os
+import tempfile
+from unittest.mock import patch
+
+from coffeeconnection.logger import LOGGER, log_members, setup_logger
+
+
+def test_setup_logger():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "coffeeconnection.log")
+        handlers = list(LOGGER.handlers)
+        with patch("coffeeconnection.logger.LOG_MAX_SIZE", 200):
+            listener = setup_logger(path)
+        try:
+            for index in range(20):
+                LOGGER.debug("line %s", index)
+        finally:
+            listener.stop()
+            atexit.unregister(listener.stop)
+            LOGGER.handlers = handlers
+        assert os.path.exists(path + ".1")
+        with open(path) as fp:
+            assert "line 19" in fp.read()
+
+
+def test_log_members(caplog):
+    members = [str(i) for i in range(100)]
+    with caplog.at_level(logging.DEBUG):
+        log_members("may have a coffee", members, "summary", 3)
+    assert [record.getMessage() for record in caplog.records] == [
+        "100 members may have a coffee",
+        "may have a coffee: 0 1 2",
+    ]
+
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG):
+        log_members("may have a coffee", members, "all")
+    assert len(caplog.records) == 100
+    assert caplog.records[0].getMessage() == "0 may have a coffee"
@@ -0,0 +1,111 @@
+import random
+import time
+
+from coffeeconnection import coffeeconnection
+from coffeeconnection.matching import (
+    PairHistory,
+    group_pairs,
+    group_players,
+    group_sizes,
+    pair_players,
+)
+
+
+def test_pair_history():
+    history = PairHistory([("a", "b", 2), ("d", "c", 1)])
+    history.add("b", "a")
+    assert history.count("a", "b") == 3
+    assert history.count("c", "d") == 1
+    assert history.count("a", "c") == 0
+    assert len(history) == 2
+
+
+def test_pair_players_avoid_repeats():
+    history = PairHistory([("a", "b", 1), ("c", "d", 1)])
+    for _ in range(20):
+        players = ["a", "b", "c", "d"]
+        random.shuffle(players)
+        matches = pair_players(players, history)
+        assert len(matches) == 2
+        for couple in matches:
+            assert history.count(*couple) == 0
+
+
+def test_pair_players_odd():
+    players = ["a", "b", "c"]
+    matches = pair_players(players, PairHistory())
+    assert len(matches) == 1
+    assert len(players) == 1
+
+
+def test_create_matches_history():
+    history = PairHistory([("a", "b", 1)])
+    matches, queue = coffeeconnection.create_matches(["a", "c", "b", "d"], 1, history)
+    assert len(matches) == 2
+    assert queue == []
+    assert ("a", "b") not in matches and ("b", "a") not in matches
+
+
+def test_pair_players_large():
+    members = [str(i) for i in range(10000)]
+    history = PairHistory()
+    for _ in range(10):
+        random.shuffle(members)
+        for i in range(0, len(members), 2):
+            history.add(members[i], members[i + 1])
+
+    players = members[:]
+    random.shuffle(players)
+    start = time.perf_counter()
+    matches = pair_players(players, history)
+    assert time.perf_counter() - start < 1
+    assert len(matches) == 5000
+    assert sum(history.count(*couple) for couple in matches) < 50
+
+
+def test_group_sizes():
+    assert group_sizes(1, 3) == []
+    assert group_sizes(2, 3) == [2]
+    assert group_sizes(7, 3) == [3, 2, 2]
+    assert group_sizes(9, 3) == [3, 3, 3]
+    assert group_sizes(10, 4) == [4, 3, 3]
+    assert sum(group_sizes(1001, 4)) == 1001
+
+
+def test_group_pairs():
+    assert list(group_pairs(("a", "b", "c"))) == [("a", "b"), ("a", "c"), ("b", "c")]
+
+
+def test_group_players_avoid_repeats():
+    history = PairHistory([("a", "b", 1), ("c", "d", 1), ("e", "f", 1)])
+    for _ in range(20):
+        players = ["a", "b", "c", "d", "e", "f"]
+        random.shuffle(players)
+        groups = group_players(players, history, 3)
+        assert len(groups) == 2
+        assert players == []
+        for group in groups:
+            assert sum(history.count(*pair) for pair in group_pairs(group)) == 0
+
+
+def test_create_matches_groups():
+    queue = [str(i) for i in range(23)]
+    matches, queue = coffeeconnection.create_matches(queue, 5, group_size=3)
+    assert [len(group) for group in matches] == [3, 3]
+    assert len(queue) == 17
+
+    # the last day, nobody is left alone
+    matches, queue = coffeeconnection.create_matches(queue, 1, group_size=3)
+    assert sorted(len(group) for group in matches) == [2, 3, 3, 3, 3, 3]
+    assert queue == []
+
+    matches, queue = coffeeconnection.create_matches(["a", "b", "c", "d"], 2, None, 3)
+    assert [len(group) for group in matches] == [2, 2]
+
+
+def test_group_players_large():
+    players = [str(i) for i in range(10000)]
+    start = time.perf_counter()
+    groups = group_players(players, PairHistory(), 4)
+    assert time.perf_counter() - start < 1
+    assert len(groups) == 2500
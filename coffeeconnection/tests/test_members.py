@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from coffeeconnection import coffeeconnection
+from coffeeconnection.members import Members, as_members
+
+
+def test_members():
+    members = Members(["a", "b", "c", "b"])
+    assert members == ["a", "b", "c"]
+    assert len(members) == 3
+    assert "b" in members and "d" not in members
+    assert members[0] == "a"
+
+    members.discard("a")
+    members.discard("d")
+    assert "a" not in members
+    assert sorted(members) == ["b", "c"]
+
+    members.add("a")
+    assert "a" in members
+    assert members.interned["a"].index == 0
+
+
+def test_members_take():
+    members = Members(["a", "b", "c", "d"])
+    assert members.take(2) == ["c", "d"]
+    assert members == ["a", "b"]
+    assert "c" not in members
+    assert members.take(3) == ["a", "b"]
+    assert members == []
+
+
+def test_members_copy():
+    members = Members(["a", "b"])
+    other = members.copy()
+    other.discard("a")
+    assert members == ["a", "b"]
+    assert other == ["b"]
+
+
+def test_members_sample():
+    members = Members(["a", "b", "c"])
+    for _ in range(20):
+        assert members.sample(exclude="b") in ("a", "c")
+    with pytest.raises(IndexError):
+        Members(["a"]).sample(exclude="a")
+
+
+def test_members_shuffle():
+    members = Members(str(i) for i in range(100))
+    members.shuffle()
+    assert sorted(members) == sorted(str(i) for i in range(100))
+    members.discard("42")
+    assert len(members) == 99
+    assert all(member in members for member in members)
+
+
+def test_as_members():
+    members = Members(["a"])
+    assert as_members(members) is members
+    assert as_members(["a"]) == members
+
+
+def test_alone():
+    members = ["a", "b", "c"]
+    for _ in range(20):
+        couple = coffeeconnection.alone("b", members)
+        assert couple[1] == "b"
+        assert couple[0] in ("a", "c")
+    assert members == ["a", "b", "c"]
+
+
+def test_place_leftover_large():
+    members = Members(str(i) for i in range(20000))
+    matches = [(str(i), str(i + 1)) for i in range(0, 19998, 2)]
+    start = time.perf_counter()
+    coffeeconnection.place_leftover("19999", matches, members)
+    assert time.perf_counter() - start < 1
+    assert matches[-1] == ("19998", "19999")
+
+    matches = [("a", "b", "c")]
+    coffeeconnection.place_leftover("d", matches, ["a", "b", "c", "d"], 3)
+    assert matches == [("a", "b", "c", "d")]
+
+
+def test_place_leftover_everyone_matched():
+    # the others already had their coffee of the period, and are matched today
+    matches = [("a", "b"), ("c", "d", "e")]
+    coffeeconnection.place_leftover("f", matches, ["a", "b", "c", "d", "e", "f"])
+    assert matches == [("a", "b", "f"), ("c", "d", "e")]
+
+    matches = []
+    coffeeconnection.place_leftover("a", matches, ["a"])
+    assert matches == []
@@ -0,0 +1,58 @@
+import datetime
+import json
+import os
+import tempfile
+from unittest.mock import MagicMock
+
+from coffeeconnection import coffeeconnection
+from coffeeconnection.config import Configuration
+from coffeeconnection.metrics import Metrics
+from coffeeconnection.tests.mocking import mock_config
+
+
+def test_metrics():
+    metrics = Metrics()
+    with metrics.span("say"):
+        pass
+    with metrics.span("say"):
+        pass
+    metrics.inc("pairs")
+    metrics.inc("bytes_received", 42)
+
+    summary = metrics.summary("C1")
+    assert summary["phases"]["say"]["calls"] == 2
+    assert summary["counters"] == {"pairs": 1, "bytes_received": 42}
+
+    prometheus = metrics.prometheus("C1")
+    assert 'coffeeconnection_phase_calls{channel="C1",phase="say"} 2\n' in prometheus
+    assert 'coffeeconnection_bytes_received{channel="C1"} 42\n' in prometheus
+
+    metrics.reset()
+    assert metrics.summary("C1")["phases"] == {}
+
+
+@mock_config
+def test_metrics_export():
+    config = Configuration()
+    config.load()
+    slack = coffeeconnection.Slack(config)
+    slack.get_slack_members = MagicMock(return_value=["a", "b", "c", "d"])
+    slack.match = MagicMock()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config.metrics_json = os.path.join(directory, "metrics.json")
+        config.metrics_prom = os.path.join(directory, "metrics.prom")
+        config.today = datetime.date(2018, 6, 22)
+        coffeeconnection.coffeeconnection(slack, config, [""])
+
+        with open(config.metrics_json) as fp:
+            summary = json.load(fp)
+        with open(config.metrics_prom) as fp:
+            prometheus = fp.read()
+
+    assert summary["channel"] == "slack_channel_id"
+    assert summary["counters"]["pairs"] == 2
+    assert summary["phases"]["state_write"]["calls"] == 2
+    assert summary["phases"]["create_matches"]["calls"] == 1
+    assert "state_load" in summary["phases"]
+    assert 'coffeeconnection_pairs{channel="slack_channel_id"} 2\n' in prometheus
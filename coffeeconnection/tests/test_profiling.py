@@ -0,0 +1,66 @@
+import datetime
+import os
+import pstats
+import tempfile
+import threading
+
+from coffeeconnection import coffeeconnection
+from coffeeconnection.config import Configuration
+from coffeeconnection.profiling import Profiler, percentile
+from coffeeconnection.tests.mocking import mock_config
+from coffeeconnection.tests.slackserver import SlackServer
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 51
+    assert percentile(values, 0.95) == 96
+    assert percentile([3], 0.95) == 3
+
+
+def test_profiler():
+    with tempfile.TemporaryDirectory() as directory:
+        with Profiler(directory) as profiler:
+            data = [list(range(100)) for _ in range(100)]
+            profiler.record("users.list", 0.2, 200, 1000)
+            profiler.record("users.list", 0.1, 200, 500)
+        assert data
+        assert os.path.getsize(profiler.profile_path) > 0
+        with open(profiler.report_path) as fp:
+            report = fp.read()
+    assert report.startswith("peak memory: ")
+    assert "users.list 2 0.300 0.150 0.200 0.200 0.200 1500" in report
+
+
+def worker_function():
+    return sum(range(1000))
+
+
+def test_profiler_threads():
+    with tempfile.TemporaryDirectory() as directory:
+        with Profiler(directory) as profiler:
+            thread = threading.Thread(target=worker_function)
+            thread.start()
+            thread.join()
+        stats = pstats.Stats(profiler.profile_path)
+    assert any(name == "worker_function" for _, _, name in stats.stats)
+
+
+@mock_config
+def test_profile():
+    config = Configuration()
+    config.load()
+    config.rate_limits = False
+    config.today = datetime.date(2018, 6, 11)
+    with SlackServer(40) as server, tempfile.TemporaryDirectory() as directory:
+        config.api_url = "{}/api".format(server.url)
+        config.hook = "{}/hook".format(server.url)
+        config.profile_dir = directory
+        slack = coffeeconnection.Slack(config)
+        coffeeconnection.profile(slack, config, ["{} {}"])
+
+        (report,) = [name for name in os.listdir(directory) if name.endswith(".txt")]
+        with open(os.path.join(directory, report)) as fp:
+            lines = fp.read().splitlines()
+    assert any(line.startswith("users.list 1 ") for line in lines)
+    assert any(line.startswith("webhook 4 ") for line in lines)
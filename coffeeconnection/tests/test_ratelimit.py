@@ -0,0 +1,112 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from coffeeconnection.ratelimit import RequestScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+def response(status_code, headers=None):
+    return MagicMock(status_code=status_code, headers=headers or {})
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock)
+    for _ in range(60):
+        assert bucket.reserve() == 0
+    assert bucket.reserve() == 1
+    assert bucket.reserve() == 2
+    clock.sleep(10)
+    assert bucket.reserve() == 0
+
+
+def test_token_bucket_slow_down():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock)
+    bucket.slow_down()
+    assert bucket.reserve() == 2
+
+
+def test_token_bucket_speed_up():
+    bucket = TokenBucket(60, clock=FakeClock())
+    bucket.slow_down()
+    bucket.slow_down()
+    assert bucket.rate == 0.25
+    for _ in range(10):
+        bucket.speed_up()
+    assert 0.25 < bucket.rate < 1
+    for _ in range(10):
+        bucket.speed_up()
+    assert bucket.rate == 1
+
+
+def test_scheduler_recovers():
+    clock = FakeClock()
+    scheduler = RequestScheduler(sleep=clock.sleep, clock=clock)
+    request = MagicMock(side_effect=[response(429)] + [response(200)] * 10)
+    for _ in range(10):
+        scheduler.call("webhook", request)
+    assert scheduler.bucket("webhook").rate == 1
+
+
+def test_scheduler_retry_after():
+    clock = FakeClock()
+    scheduler = RequestScheduler(sleep=clock.sleep, clock=clock)
+    request = MagicMock(
+        side_effect=[response(429, {"Retry-After": "3"}), response(200)]
+    )
+    assert scheduler.call("users.list", request).status_code == 200
+    assert request.call_count == 2
+    assert scheduler.throttled >= 3
+
+
+def test_scheduler_gives_up():
+    clock = FakeClock()
+    scheduler = RequestScheduler(max_retries=2, sleep=clock.sleep, clock=clock)
+    request = MagicMock(return_value=response(429))
+    assert scheduler.call("users.list", request).status_code == 429
+    assert request.call_count == 3
+
+
+def test_scheduler_await_call():
+    scheduler = RequestScheduler(enabled=False)
+    responses = [response(429, {"Retry-After": "0.01"}), response(200)]
+    calls = []
+
+    async def request():
+        calls.append(True)
+        return responses[len(calls) - 1]
+
+    response_ = asyncio.run(scheduler.await_call("users.list", request))
+    assert response_.status_code == 200
+    assert len(calls) == 2
+    assert scheduler.throttled >= 0.01
+
+
+def test_channel_schedulers():
+    clock = FakeClock()
+    workspace = RequestScheduler(sleep=clock.sleep, clock=clock)
+    first, second = [
+        RequestScheduler(sleep=clock.sleep, clock=clock, workspace=workspace)
+        for _ in range(2)
+    ]
+    assert first.bucket("users.list") is second.bucket("users.list")
+    assert first.bucket("webhook") is not second.bucket("webhook")
+
+    request = MagicMock(
+        side_effect=[response(429, {"Retry-After": "2"}), response(200)]
+    )
+    first.call("webhook", request)
+    assert first.throttled >= 2
+    assert second.throttled == 0
+    assert second.bucket("webhook").rate == 1
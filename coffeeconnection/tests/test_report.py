@@ -0,0 +1,48 @@
+import datetime
+import json
+import os
+import tempfile
+
+from coffeeconnection import report
+from coffeeconnection.state import SqliteState
+
+
+def make_history(path):
+    state = SqliteState(path)
+    state.record([("a", "b"), ("c", "d")], 0, datetime.date(2018, 6, 11))
+    state.record([("a", "b")], 1, datetime.date(2018, 6, 18))
+    state.close()
+
+
+def test_report(capsys):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.db")
+        make_history(path)
+
+        assert report.main(["--db", path, "coverage"]) == 0
+        assert capsys.readouterr().out.splitlines() == [
+            "period 0: 4 members, 2 pairs",
+            "period 1: 2 members, 1 pairs",
+        ]
+
+        assert report.main(["--db", path, "repeats"]) == 0
+        assert capsys.readouterr().out.splitlines() == [
+            "1 pairs had 1 coffees together",
+            "1 pairs had 2 coffees together",
+        ]
+
+        assert report.main(["--db", path, "pair", "b", "a"]) == 0
+        assert capsys.readouterr().out == (
+            "b and a: 2 coffees, the last on 2018-06-18\n"
+        )
+
+        assert report.main(["--db", path, "--json", "members", "--idle-days", "1"]) == 0
+        rows = json.loads(capsys.readouterr().out)
+        assert [row["member"] for row in rows] == ["c", "d", "a", "b"]
+        assert rows[-1]["coffees"] == 2
+
+
+def test_report_no_history():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "none.db")
+        assert report.main(["--db", path, "coverage"]) == 1
@@ -0,0 +1,63 @@
+import datetime
+import os
+import tempfile
+
+from coffeeconnection.matching import PairHistory
+from coffeeconnection.schedule import Schedule
+
+DAYS = [datetime.date(2018, 6, day) for day in range(11, 16)]
+
+
+def test_plan():
+    members = [str(i) for i in range(23)]
+    schedule = Schedule.plan(0, members, DAYS, PairHistory())
+    assert [len(schedule.days[day.isoformat()]) for day in DAYS] == [2, 2, 2, 2, 3]
+    assert len(schedule.members()) == 22
+
+
+def test_save_load():
+    schedule = Schedule.plan(3, ["a", "b", "c", "d"], DAYS, PairHistory())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "schedule.json")
+        assert Schedule.load(path) is None
+        schedule.save(path)
+        loaded = Schedule.load(path)
+    assert loaded.period == 3
+    assert loaded.days == schedule.days
+
+
+def test_take():
+    schedule = Schedule(0, {"2018-06-11": [("a", "b")], "2018-06-12": [("c", "d")]})
+    assert schedule.take(datetime.date(2018, 6, 12)) == [("a", "b"), ("c", "d")]
+    assert schedule.days == {}
+
+
+def test_today_patch():
+    schedule = Schedule(
+        0, {"2018-06-11": [("a", "b"), ("c", "d")], "2018-06-12": [("e", "f")]}
+    )
+    # d left, g joined, e and f are planned tomorrow
+    members = ["a", "b", "c", "e", "f", "g", "h"]
+    matches, waiting = schedule.today(DAYS[0], members, {"h"}, PairHistory())
+    assert matches[0] == ("a", "b")
+    assert sorted(matches[1]) == ["c", "g"]
+    assert waiting == []
+    assert schedule.days == {"2018-06-12": [("e", "f")]}
+
+
+def test_today_odd():
+    schedule = Schedule(0, {"2018-06-11": [("a", "b")]})
+    matches, waiting = schedule.today(DAYS[0], ["a", "b", "c"], set(), PairHistory())
+    assert matches == [("a", "b")]
+    assert waiting == ["c"]
+
+
+def test_plan_groups():
+    members = [str(i) for i in range(23)]
+    schedule = Schedule.plan(0, members, DAYS, PairHistory(), 3)
+    assert len(schedule.members()) == 23
+
+    # a trio missing one member is kept as a pair
+    schedule = Schedule(0, {"2018-06-11": [("a", "b", "c")]})
+    matches, waiting = schedule.today(DAYS[0], ["a", "c"], set(), PairHistory(), 3)
+    assert matches == [("a", "c")]
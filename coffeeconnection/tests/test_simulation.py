@@ -0,0 +1,36 @@
+import random
+
+from coffeeconnection.simulation import simulate
+
+
+def test_simulate():
+    reports = simulate(members=40, periods=3, leave_rate=0, absence_rate=0, seed=1)
+    assert len(reports) == 3
+    for report in reports:
+        # weekends are off
+        assert report["days"] == 5
+        assert report["coverage"] == 1
+        assert report["pairs"] >= report["members"] // 2
+
+
+def test_simulate_history():
+    reports = simulate(members=30, periods=4, join_rate=0, leave_rate=0, seed=2)
+    # 60 pairs, less than 5% of them repeated
+    assert sum(report["repeated_pairs"] for report in reports) <= 3
+
+
+def test_simulate_absences():
+    # the absent members are dropped by their status, as in production
+    (report,) = simulate(members=10, periods=1, absence_rate=1, seed=3)
+    assert report["members"] == 0
+    assert report["pairs"] == 0
+    assert report["days"] == 5
+
+
+def test_simulate_seed():
+    state = random.getstate()
+    reports = [simulate(periods=2, seed=4) for _ in range(2)]
+    for report in reports[0] + reports[1]:
+        del report["seconds_per_day"]
+    assert reports[0] == reports[1]
+    assert random.getstate() == state
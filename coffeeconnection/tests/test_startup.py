@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ["requests", "pkg_resources", "appdirs", "sqlite3"]
+HTTP_MODULES = ["requests", "urllib3", "concurrent.futures"]
+# the slowest of the other modules, imported by the HTTP stack
+SLOW_MODULES = ["ssl", "http.client", "email.parser", "aiohttp", "asyncio"]
+
+OFF_DAY = """
+import datetime, sys, tempfile
+from coffeeconnection import coffeeconnection
+from coffeeconnection.config import Configuration
+
+config = Configuration()
+config.epoch = datetime.date(2018, 6, 11)
+config.week_period = 1
+config.today = datetime.date(2018, 6, 16)
+with tempfile.NamedTemporaryFile() as hadcoffee:
+    config.hadcoffee_file = hadcoffee.name
+    coffeeconnection.coffeeconnection(coffeeconnection.Slack(config), config, [])
+print(" ".join(sorted(set(sys.argv[1:]).intersection(sys.modules))))
+"""
+
+
+def python(code, *args):
+    return subprocess.run(
+        [sys.executable, "-c", code] + list(args),
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+def test_import_is_light():
+    loaded = python(
+        "import sys, coffeeconnection.coffeeconnection; "
+        "print(' '.join(sorted(set(sys.argv[1:]).intersection(sys.modules))))",
+        *HEAVY_MODULES
+    )
+    assert loaded == ""
+
+
+def test_import_skips_slow_modules():
+    loaded = python(
+        "import sys, coffeeconnection.coffeeconnection; "
+        "print(' '.join(sorted(set(sys.argv[1:]).intersection(sys.modules))))",
+        *(HTTP_MODULES + SLOW_MODULES)
+    )
+    assert loaded == ""
+
+
+def test_off_day_skips_http_stack():
+    assert python(OFF_DAY, *HTTP_MODULES) == ""
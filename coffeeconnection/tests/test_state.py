@@ -0,0 +1,247 @@
+import datetime
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from coffeeconnection.state import (
+    JournalState,
+    SqliteState,
+    TextFileState,
+    get_period,
+)
+
+
+def test_get_period():
+    epoch = datetime.date(2018, 6, 11)
+    assert get_period(datetime.date(2018, 6, 11), epoch, 1) == 0
+    assert get_period(datetime.date(2018, 6, 17), epoch, 1) == 0
+    assert get_period(datetime.date(2018, 6, 18), epoch, 1) == 1
+    assert get_period(datetime.date(2018, 6, 18), epoch, 2) == 0
+    assert get_period(datetime.date(2018, 6, 25), epoch, 2) == 1
+
+
+def test_text_state():
+    with tempfile.TemporaryDirectory() as directory:
+        state = TextFileState(os.path.join(directory, "hadcoffee.txt"))
+        assert state.load(0) == set()
+        state.record([("a", "b")], 0, datetime.date(2018, 6, 11))
+        state.record([("c", "d")], 0, datetime.date(2018, 6, 12))
+        assert state.load(0) == {"a", "b", "c", "d"}
+        state.reset(1)
+        assert state.load(1) == set()
+
+
+def test_sqlite_state():
+    with tempfile.TemporaryDirectory() as directory:
+        state = SqliteState(os.path.join(directory, "state.db"))
+        state.record([("a", "b"), ("c", "d")], 0, datetime.date(2018, 6, 11))
+        assert state.load(0) == {"a", "b", "c", "d"}
+        state.reset(1)
+        assert state.load(1) == set()
+        state.record([("a", "c")], 1, datetime.date(2018, 6, 18))
+        state.close()
+
+        state = SqliteState(os.path.join(directory, "state.db"))
+        assert state.load(0) == {"a", "b", "c", "d"}
+        assert state.load(1) == {"a", "c"}
+        assert sorted(state.partners("a")) == ["b", "c"]
+        state.close()
+
+
+def test_sqlite_pair_counts():
+    with tempfile.TemporaryDirectory() as directory:
+        state = SqliteState(os.path.join(directory, "state.db"))
+        state.record([("a", "b"), ("c", "d")], 0, datetime.date(2018, 6, 11))
+        state.record([("b", "a")], 1, datetime.date(2018, 6, 18))
+        assert sorted(state.pair_counts()) == [("a", "b", 2), ("c", "d", 1)]
+        state.close()
+
+
+def test_journal_state():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "hadcoffee.txt")
+        state = JournalState(path)
+        assert state.load(0) == set()
+        state.record([("a", "b")], 0, datetime.date(2018, 6, 11))
+        state.record([("c", "d")], 0, datetime.date(2018, 6, 12))
+
+        state = JournalState(path)
+        assert state.load(0) == {"a", "b", "c", "d"}
+        assert state.load(1) == set()
+
+        state.reset(1)
+        assert os.path.getsize(path) == 0
+        state.record([("b", "a")], 1, datetime.date(2018, 6, 18))
+
+        state = JournalState(path)
+        assert state.load(1) == {"a", "b"}
+        history = state.pair_history()
+        assert history.count("a", "b") == 2
+        assert history.count("c", "d") == 1
+
+
+def test_journal_state_crash():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "hadcoffee.txt")
+        state = JournalState(path)
+        state.record([("a", "b")], 0, datetime.date(2018, 6, 11))
+        # crash while writing a line
+        with open(path, "a") as fp:
+            fp.write("0 2018-06-11 c")
+        assert JournalState(path).load(0) == {"a", "b"}
+
+        # crash after the snapshot was written but before the journal truncation
+        with open(path) as fp:
+            journal = fp.read()
+        JournalState(path).reset(1)
+        with open(path, "w") as fp:
+            fp.write(journal)
+        state = JournalState(path)
+        assert state.load(1) == set()
+        assert state.pair_history().count("a", "b") == 1
+
+
+def test_journal_state_torn_line():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "hadcoffee.txt")
+        JournalState(path).record([("a", "b")], 0, datetime.date(2018, 6, 11))
+        # crash while writing a line, then the next run records a couple
+        with open(path, "a") as fp:
+            fp.write("0 2018-06-11 c")
+        JournalState(path).record([("e", "f")], 0, datetime.date(2018, 6, 12))
+        assert JournalState(path).load(0) == {"a", "b", "e", "f"}
+        with open(path) as fp:
+            assert fp.read().splitlines()[-1] == "0 2018-06-12 e f"
+
+
+def test_journal_state_reset_twice():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "hadcoffee.txt")
+        JournalState(path).record([("c", "d")], 0, datetime.date(2018, 6, 15))
+        state = JournalState(path)
+        state.reset(1)
+        state.record([("a", "b")], 1, datetime.date(2018, 6, 18))
+
+        # the cron is run again on the first day of the period
+        state = JournalState(path)
+        state.reset(1)
+        assert state.load(1) == {"a", "b"}
+        assert state.pair_history().count("c", "d") == 1
+
+
+def test_journal_state_former_format():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "hadcoffee.txt")
+        with open(path, "w") as fp:
+            fp.write("a\nb\n")
+        state = JournalState(path)
+        state.record([("c", "d")], 3, datetime.date(2018, 7, 2))
+        assert state.load(3) == {"a", "b", "c", "d"}
+        state.reset(4)
+        assert state.load(4) == set()
+        assert state.pair_history().count("c", "d") == 1
+
+
+def test_record_groups():
+    with tempfile.TemporaryDirectory() as directory:
+        for state in (
+            JournalState(os.path.join(directory, "hadcoffee.txt")),
+            SqliteState(os.path.join(directory, "state.db")),
+        ):
+            state.record([("a", "b", "c"), ("d", "e")], 0, datetime.date(2018, 6, 11))
+            assert state.load(0) == {"a", "b", "c", "d", "e"}
+            history = state.pair_history()
+            assert len(history) == 4
+            assert history.count("c", "a") == 1
+            state.close()
+
+
+def test_sqlite_aggregates():
+    with tempfile.TemporaryDirectory() as directory:
+        state = SqliteState(os.path.join(directory, "state.db"))
+        state.record([("a", "b"), ("c", "d", "e")], 0, datetime.date(2018, 6, 11))
+        state.record([("b", "a")], 0, datetime.date(2018, 6, 12))
+        state.record([("a", "c")], 1, datetime.date(2018, 6, 18))
+
+        assert state.coverage() == [(0, 5, 5), (1, 2, 1)]
+        assert state.repeat_frequency() == [(1, 4), (2, 1)]
+        assert state.met("b", "a") == (2, "2018-06-12")
+        assert state.met("a", "e") == (0, None)
+        participation = {row[0]: row[1:] for row in state.participation()}
+        assert participation["a"] == (3, 2, "2018-06-11", "2018-06-18")
+        assert [row[0] for row in state.participation(datetime.date(2018, 6, 12))] == [
+            "d",
+            "e",
+        ]
+        state.close()
+
+
+def test_sqlite_aggregates_former_database():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.db")
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.executescript(SqliteState.SCHEMA)
+            connection.executemany(
+                "INSERT INTO coffee VALUES (?, ?, ?, ?)",
+                [
+                    (0, "2018-06-11", "a", "b"),
+                    (0, "2018-06-11", "b", "a"),
+                    (1, "2018-06-18", "a", "b"),
+                    (1, "2018-06-18", "b", "a"),
+                ],
+            )
+        connection.close()
+
+        state = SqliteState(path)
+        assert state.coverage() == [(0, 2, 1), (1, 2, 1)]
+        assert state.met("a", "b") == (2, "2018-06-18")
+        state.record([("a", "c")], 1, datetime.date(2018, 6, 19))
+        assert state.coverage() == [(0, 2, 1), (1, 3, 2)]
+        participation = {row[0]: row[1:] for row in state.participation()}
+        assert participation["a"] == (3, 2, "2018-06-11", "2018-06-19")
+        state.close()
+
+
+def test_sqlite_aggregates_rebuilt():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.db")
+        state = SqliteState(path)
+        state.record([("a", "b"), ("c", "d", "e")], 0, datetime.date(2018, 6, 11))
+        # a second run of the day
+        state.record([("a", "f")], 0, datetime.date(2018, 6, 11))
+        state.record([("a", "c")], 1, datetime.date(2018, 6, 18))
+        participation = state.participation()
+        assert ("a", 2, 2, "2018-06-11", "2018-06-18") in participation
+        state.connection.executescript(
+            "DROP TABLE pair_stats; DROP TABLE member_stats; DROP TABLE period_stats;"
+            "PRAGMA user_version = 0;"
+        )
+        state.close()
+
+        state = SqliteState(path)
+        assert state.participation() == participation
+        state.close()
+
+
+def test_sqlite_aggregates_failed_migration():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.db")
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.executescript(SqliteState.SCHEMA)
+            # makes the migration fail after the first tables are created
+            connection.execute("CREATE TABLE period_stats (period INTEGER)")
+        connection.close()
+
+        with pytest.raises(sqlite3.OperationalError):
+            SqliteState(path)
+        connection = sqlite3.connect(path)
+        tables = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+        assert sorted(row[0] for row in tables) == ["coffee", "period_stats"]
+        assert connection.execute("PRAGMA user_version").fetchone() == (0,)
+        connection.close()
@@ -0,0 +1,53 @@
+import datetime
+import tempfile
+from unittest.mock import MagicMock
+
+from coffeeconnection.workdays import WorkCalendar, read_holidays
+
+
+def test_calendar():
+    epoch = datetime.date(2018, 6, 11)
+    calendar = WorkCalendar(epoch, 2, [datetime.date(2018, 6, 13)])
+
+    assert calendar.is_off(datetime.date(2018, 6, 13))
+    assert calendar.is_off(datetime.date(2018, 6, 16))
+    assert not calendar.is_off(datetime.date(2018, 6, 14))
+
+    assert calendar.dayleft(datetime.date(2018, 6, 11)) == 9
+    assert calendar.dayleft(datetime.date(2018, 6, 14)) == 7
+    assert calendar.dayleft(datetime.date(2018, 6, 22)) == 1
+    assert calendar.dayleft(datetime.date(2018, 6, 25)) == 10
+
+    assert calendar.period(datetime.date(2018, 6, 24)) == 0
+    assert calendar.period(datetime.date(2018, 6, 25)) == 1
+    assert calendar.period_start(datetime.date(2018, 7, 1)) == datetime.date(
+        2018, 6, 25
+    )
+    assert calendar.is_period_start(datetime.date(2018, 6, 25))
+    assert not calendar.is_period_start(datetime.date(2018, 6, 18))
+
+    assert calendar.working_days(datetime.date(2018, 6, 19)) == [
+        datetime.date(2018, 6, day) for day in (19, 20, 21, 22)
+    ]
+
+
+def test_calendar_from_config():
+    with tempfile.NamedTemporaryFile("w") as holidays:
+        holidays.write("# France\n2018-07-14\n\n2018-08-15  # assumption\n")
+        holidays.flush()
+        assert read_holidays(holidays.name) == [
+            datetime.date(2018, 7, 14),
+            datetime.date(2018, 8, 15),
+        ]
+
+        config = MagicMock(
+            epoch=datetime.date(2018, 6, 11),
+            week_period=1,
+            days_off=["2018-08-14"],
+            holidays_files=[holidays.name],
+        )
+        calendar = WorkCalendar.from_config(config)
+
+    assert calendar.is_off(datetime.date(2018, 8, 14))
+    assert calendar.is_off(datetime.date(2018, 8, 15))
+    assert calendar.dayleft(datetime.date(2018, 8, 13)) == 3
@@ -0,0 +1,79 @@
+import datetime
+
+
+def parse_day(day):
+    return datetime.datetime.strptime(day, "%Y-%m-%d").date()
+
+
+def read_holidays(filepath):
+    """ Read a holiday file: one YYYY-MM-DD day per line, # starts a comment
+    """
+    days = []
+    with open(filepath) as fp:
+        for line in fp:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                days.append(parse_day(line))
+    return days
+
+
+class WorkCalendar:
+    """ Working days of the periods starting at epoch
+    Saturday, Sunday and the days off are not worked. The number of working
+    days left is precomputed once per period, so every question is answered
+    in O(1).
+    """
+
+    def __init__(self, epoch, week_period, days_off=()):
+        self.epoch = epoch
+        self.length = week_period * 7
+        self.days_off = {day.toordinal() for day in days_off}
+        self.periods = {}
+
+    @classmethod
+    def from_config(cls, config):
+        days_off = [parse_day(day) for day in config.days_off]
+        for filepath in config.holidays_files:
+            days_off.extend(read_holidays(filepath))
+        return cls(config.epoch, config.week_period, days_off)
+
+    def is_off(self, day):
+        return day.weekday() >= 5 or day.toordinal() in self.days_off
+
+    def period(self, day):
+        return (day - self.epoch).days // self.length
+
+    def period_start(self, day):
+        return self.epoch + datetime.timedelta(days=self.period(day) * self.length)
+
+    def is_period_start(self, day):
+        return (day - self.epoch).days % self.length == 0
+
+    def _days_left(self, period):
+        """ For every day of the period, the number of working days from this
+        day to the end of the period
+        """
+        if period not in self.periods:
+            start = self.epoch + datetime.timedelta(days=period * self.length)
+            left = [0] * (self.length + 1)
+            for index in range(self.length - 1, -1, -1):
+                day = start + datetime.timedelta(days=index)
+                left[index] = left[index + 1] + (0 if self.is_off(day) else 1)
+            self.periods[period] = left
+        return self.periods[period]
+
+    def dayleft(self, day):
+        """ Number of working days left in the period, today included
+        """
+        return self._days_left(self.period(day))[(day - self.epoch).days % self.length]
+
+    def working_days(self, day):
+        """ The working days from day to the end of its period
+        """
+        end = self.period_start(day) + datetime.timedelta(days=self.length)
+        days = []
+        while day < end:
+            if not self.is_off(day):
+                days.append(day)
+            day += datetime.timedelta(days=1)
+        return days
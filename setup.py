@@ -7,8 +7,16 @@ setup(
     version="0.2.0",
     packages=find_packages(),
     install_requires=["appdirs", "requests"],
+    extras_require={"async": ["aiohttp"]},
     entry_points={
-        "console_scripts": ["coffeeconnection = coffeeconnection.coffeeconnection:main"]
+        "console_scripts": [
+            "coffeeconnection = coffeeconnection.coffeeconnection:main",
+            "coffeeconnection-daemon = coffeeconnection.daemon:main",
+            "coffeeconnection-simulate = coffeeconnection.simulation:main",
+            "coffeeconnection-events = coffeeconnection.events:main",
+            "coffeeconnection-async = coffeeconnection.asyncslack:main [async]",
+            "coffeeconnection-report = coffeeconnection.report:main",
+        ]
     },
     include_package_data=True,
     description="Match people for a coffee over slack",